@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flow.basic import GracefulInputBuffer, NearestNeighbourResampler
+from flow.dsp import SineFrequencyModulator
+from flow.nodes import NodeInput
+from flow.waveform import CachedFrameSource
+
+SAMPLE_RATE = 48000
+CENTER = 800
+DEVIATION = 190
+BAUD = 100
+FRAME_COUNT = 20
+
+PREFIX = bytes([0x00, 0x00, 0xC1, 0xFA])
+MESSAGE = b"Hello world!"
+
+
+def runGraph():
+    # Written and read from this one thread, so a blocking buffer would wait forever on the resampler's look-ahead
+    source = GracefulInputBuffer(blocking=False)
+    resampler = NearestNeighbourResampler(SAMPLE_RATE / BAUD)
+    modulator = SineFrequencyModulator(CENTER, DEVIATION, SAMPLE_RATE, True)
+    resampler.inputs["original"].assignProducer(source.outputs["samples"])
+    modulator.inputs["baseband"].assignProducer(resampler.outputs["resampled"])
+    reader = NodeInput()
+    reader.assignProducer(modulator.outputs["modulated"])
+
+    frame_length = 0
+    for _ in range(FRAME_COUNT):
+        bits = numpy.unpackbits(numpy.frombuffer(PREFIX + MESSAGE, dtype=numpy.uint8))
+        manchester = numpy.empty(len(bits) * 2)
+        for index, bit in enumerate(bits):
+            manchester[2 * index] = bit
+            manchester[2 * index + 1] = not bit
+        source.write(manchester * 2 - 1)
+        frame_length = len(manchester) * SAMPLE_RATE // BAUD
+        reader.read(frame_length)
+    return frame_length
+
+
+def runCached():
+    source = CachedFrameSource(CENTER, DEVIATION, BAUD, SAMPLE_RATE)
+    reader = NodeInput()
+    reader.assignProducer(source.outputs["modulated"])
+    for _ in range(FRAME_COUNT):
+        source.send(PREFIX, MESSAGE)
+        reader.read(source.getQueuedCount())
+
+
+frame_length = runGraph()
+print(f"{'transmitter':<12}{'CPU ms/frame':>14}")
+for name, case in (("graph", runGraph), ("cached", runCached)):
+    start = time.process_time()
+    case()
+    print(f"{name:<12}{(time.process_time() - start) / FRAME_COUNT * 1000:>14.2f}")
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flow import kernels
+from flow.fec import ConvolutionalCode, ReedSolomonCode, BlockInterleaver
+
+MESSAGE_BITS = 2 ** 16
+CODEWORD_COUNT = 256
+REPEATS = 5
+
+random = numpy.random.default_rng(0)
+
+convolutional = ConvolutionalCode()
+message = random.integers(0, 2, MESSAGE_BITS).astype(numpy.uint8)
+coded = convolutional.encode(message)
+soft = 2.0 * coded - 1 + 0.7 * random.standard_normal(len(coded))
+
+reed_solomon = ReedSolomonCode()
+messages = random.integers(0, 256, (CODEWORD_COUNT, reed_solomon.message_length)).astype(numpy.uint8)
+codewords = reed_solomon.encode(messages)
+# Every fourth codeword carries the most errors the code can still correct
+for row in range(0, CODEWORD_COUNT, 4):
+    positions = random.choice(reed_solomon.codeword_length, reed_solomon.parity_length // 2, replace=False)
+    codewords[row, positions] ^= random.integers(1, 256, len(positions)).astype(numpy.uint8)
+
+interleaver = BlockInterleaver(16, 64)
+interleaved = interleaver.interleave(numpy.resize(coded, len(coded) // interleaver.block_size * interleaver.block_size))
+
+CASES = {
+    "viterbi": (lambda: convolutional.decode(soft), MESSAGE_BITS),
+    "reed-solomon": (lambda: reed_solomon.decode(codewords)[0], messages.size * 8),
+    "deinterleave": (lambda: interleaver.deinterleave(interleaved), len(interleaved)),
+    }
+
+
+def measure(case):
+    # The first call also pays for JIT compilation, so it is left out of the timing
+    result = case()
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        case()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+backends = ["numpy"]
+try:
+    import numba
+    backends.append("numba")
+except ImportError:
+    print("numba is not installed, only the numpy backend is measured")
+
+print(f"{'decoder':<16}{'backend':<10}{'Mbit/s':>10}")
+for backend in backends:
+    kernels.setBackend(backend)
+    for name, (case, bit_count) in CASES.items():
+        result, elapsed = measure(case)
+        print(f"{name:<16}{backend:<10}{bit_count / elapsed / 1e6:>10.2f}")
+
+        # Decoding has to recover what was sent, otherwise the number above means nothing
+        if name == "viterbi" and numpy.count_nonzero(result != message) > MESSAGE_BITS // 1000:
+            raise AssertionError("Viterbi decoding left too many errors")
+        if name == "reed-solomon" and not numpy.array_equal(result, messages):
+            raise AssertionError("Reed-Solomon decoding failed")
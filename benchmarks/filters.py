@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flow.dsp import LowPassFilter, BandpassFilter, PeakFilter, FilterBank
+from flow.nodes import NodeInput
+
+SAMPLE_RATE = 48000
+SAMPLE_COUNT = 2 ** 20
+BLOCK_SIZE = 2 ** 14
+REPEATS = 3
+
+random = numpy.random.default_rng(0)
+samples = random.standard_normal(SAMPLE_COUNT)
+
+
+def makeFilters():
+    return [
+        LowPassFilter(50, 50, 2 ** 12, SAMPLE_RATE),
+        BandpassFilter(400, 1200, 100, 2 ** 12, SAMPLE_RATE),
+        PeakFilter(100, 10, 2 ** 12, SAMPLE_RATE),
+        ]
+
+
+def runSeparate():
+    filters = makeFilters()
+    readers = []
+    for node_filter in filters:
+        reader = NodeInput()
+        reader.assignProducer(node_filter.outputs["filtered"])
+        readers.append((node_filter, reader))
+    for start in range(0, SAMPLE_COUNT, BLOCK_SIZE):
+        for node_filter, reader in readers:
+            node_filter.inputs[node_filter.input_key].write(samples[start:start + BLOCK_SIZE])
+            reader.read(BLOCK_SIZE)
+
+
+def runBank():
+    bank = FilterBank(makeFilters())
+    readers = []
+    for node_output in bank.outputs["filtered"]:
+        reader = NodeInput()
+        reader.assignProducer(node_output)
+        readers.append(reader)
+    for start in range(0, SAMPLE_COUNT, BLOCK_SIZE):
+        bank.inputs["unfiltered"].write(samples[start:start + BLOCK_SIZE])
+        for reader in readers:
+            reader.read(BLOCK_SIZE)
+
+
+def measure(case):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        case()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+print(f"{'filters':<12}{'Msamples/s':>12}")
+for name, case in (("separate", runSeparate), ("bank", runBank)):
+    print(f"{name:<12}{SAMPLE_COUNT / measure(case) / 1e6:>12.2f}")
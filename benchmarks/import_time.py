@@ -0,0 +1,40 @@
+import subprocess
+import statistics
+import sys
+import os
+
+MODULES = ["flow.nodes", "flow.basic", "flow.dsp", "flow.io", "flow.plotting"]
+HEAVY_MODULES = ["scipy.signal", "matplotlib", "pyaudio"]
+REPEATS = 5
+
+PROBE = """
+import sys
+import time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+print(f"{'module':<16}{'min ms':>10}{'median ms':>12}  heavy modules loaded")
+for module in MODULES:
+    timings = []
+    for _ in range(REPEATS):
+        # A fresh interpreter per run so nothing is already cached in sys.modules
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=root,
+            capture_output=True,
+            text=True
+            )
+        if result.returncode != 0:
+            break
+        elapsed, loaded = result.stdout.strip().partition(" ")[::2]
+        timings.append(float(elapsed) * 1000)
+    if not timings:
+        print(f"{module:<16}{'failed':>10}  {result.stderr.strip().splitlines()[-1]}")
+        continue
+    print(f"{module:<16}{min(timings):>10.1f}{statistics.median(timings):>12.1f}  {loaded or '-'}")
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flow import kernels
+
+SAMPLE_COUNT = 2 ** 20
+REPEATS = 5
+
+random = numpy.random.default_rng(0)
+frequency = 800 + 190 * numpy.sign(random.standard_normal(SAMPLE_COUNT))
+time_deltas = numpy.full(SAMPLE_COUNT, 1 / 48000)
+original = random.standard_normal(SAMPLE_COUNT)
+clock = numpy.sign(numpy.sin(numpy.arange(SAMPLE_COUNT) / 76.4))
+bits = random.integers(0, 2, SAMPLE_COUNT).astype(numpy.uint8)
+qpsk = numpy.exp(1j * (numpy.pi / 4 + numpy.pi / 2 * numpy.arange(4)))
+received = qpsk[random.integers(0, 4, SAMPLE_COUNT // 64)] * numpy.exp(0.3j) + 0.05 * random.standard_normal(SAMPLE_COUNT // 64)
+
+CASES = {
+    "integratePhase": (lambda: kernels.integratePhase(frequency, time_deltas, 0.5), SAMPLE_COUNT),
+    "sampleRisingEdges": (lambda: kernels.sampleRisingEdges(original, clock, 1.0), SAMPLE_COUNT),
+    "manchesterDecode": (lambda: kernels.manchesterDecode(bits), SAMPLE_COUNT),
+    "trackCarrier": (lambda: kernels.trackCarrier(received, qpsk, 0.0, 0.0, 0.05, 0.002)[0], len(received)),
+    }
+
+
+def measure(case):
+    # The first call also pays for JIT compilation, so it is left out of the timing
+    result = case()
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        case()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+backends = ["numpy"]
+try:
+    import numba
+    backends.append("numba")
+except ImportError:
+    print("numba is not installed, only the numpy backend is measured")
+
+results = {}
+print(f"{'kernel':<20}{'backend':<10}{'Msamples/s':>12}")
+for backend in backends:
+    kernels.setBackend(backend)
+    for name, (case, input_count) in CASES.items():
+        result, elapsed = measure(case)
+        results.setdefault(name, []).append(result)
+        print(f"{name:<20}{backend:<10}{input_count / elapsed / 1e6:>12.2f}")
+
+# Every backend has to produce the same output as the numpy reference
+for name, outputs in results.items():
+    for output in outputs[1:]:
+        if not numpy.allclose(outputs[0], output, rtol=0, atol=1e-6):
+            raise AssertionError(f"{name} differs between backends")
+print("all backends agree")
@@ -2,6 +2,8 @@ from flow.dsp import *
 from flow.io import *
 from flow.basic import *
 from flow.plotting import *
+from flow.graph import Graph
+from flow.kernels import manchesterDecode
 import bitstring
 import time
 import matplotlib
@@ -15,7 +17,8 @@ BAUD = 160#80#160
 
 audio = AudioIO(2, SAMP_RATE, 1, 1024)
 
-inp = GracefulInputBuffer()
+# The sound card pulls the transmitter, which has to carry on with silence between frames
+inp = GracefulInputBuffer(blocking=False)
 resamp = NearestNeighbourResampler(SAMP_RATE / BAUD)
 resamp2 = NearestNeighbourResampler(SAMP_RATE / BAUD)
 mod = SineFrequencyModulator(CENTER, DEV, SAMP_RATE, False)
@@ -38,7 +41,7 @@ tlow = Filter(freqs, [0, 0, 1, 1, 0, 0, 1, 1, 0, 0], 2 ** 12, SAMP_RATE)
 demod = FrequencyDemodulator(CENTER, DEV, 2 * (2 * DEV), 0.1 * DEV, 2 ** 12, SAMP_RATE)
 low = LowPassFilter(BAUD / 2, BAUD / 2, 2 ** 12, SAMP_RATE)
 ck = ClockExtractor(BAUD, BAUD * 0.1, 2 ** 13, SAMP_RATE)
-ckdel = Delay((2 ** 12) % (SAMP_RATE // BAUD) + (SAMP_RATE // BAUD // 2))
+ckdel = Delay(getClockDelay(demod, low, ck, BAUD, SAMP_RATE))
 samp = ClockedSampler(1024)
 out = OutputBuffer()
 
@@ -109,6 +112,9 @@ def producer():
         time.sleep(((4 + MN) * 8 * 2) / BAUD + 0)
         #time.sleep(15)
 
+def toBits(array):
+    return bitstring.Bits(bytes=numpy.packbits(array).tobytes(), length=len(array))
+
 def consumer():
     sync = bitstring.Bits(length=16, uint=0xC1FA)
     buffer = bitstring.BitArray()
@@ -118,18 +124,9 @@ def consumer():
         sample = out.read(1)[0]
         bit = bitstring.Bits(bool=sample > 0)
         buffer += bit
-        deman1 = bitstring.BitArray()
-        deman2 = bitstring.BitArray()
-        for i in range(len(buffer) // 2):
-            if buffer[i * 2] and not buffer[i * 2 + 1]:
-                deman1 += bitstring.Bits(bool=True)
-            elif not buffer[i * 2] and buffer[i * 2 + 1]:
-                deman1 += bitstring.Bits(bool=False)
-        for i in range(1, len(buffer) // 2):
-            if buffer[i * 2 - 1] and not buffer[i * 2 + 1 - 1]:
-                deman2 += bitstring.Bits(bool=True)
-            elif not buffer[i * 2 - 1] and buffer[i * 2 + 1 - 1]:
-                deman2 += bitstring.Bits(bool=False)
+        bits = numpy.unpackbits(numpy.frombuffer(buffer.tobytes(), dtype=numpy.uint8))[:len(buffer)]
+        deman1 = toBits(manchesterDecode(bits))
+        deman2 = toBits(manchesterDecode(bits[1:len(bits) // 2 * 2]))
         idx1 = deman1.find(sync)
         idx2 = deman2.find(sync)
         if idx1:
@@ -157,13 +154,17 @@ def consumer():
         buffer = buffer[trueidx + ((2 + MN) * 8 * 2):]
         c = 0
 
-threading.Thread(target=producer).start()
-threading.Thread(target=consumer).start()
+graph = Graph([audio, inp, resamp, resamp2, mod, amp, tlow, demod, low, ck, ckdel, samp, out, bas1plot, modplot, recplot, bas2plot, lowplot, ckplot])
+
+threading.Thread(target=producer, daemon=True).start()
+threading.Thread(target=consumer, daemon=True).start()
 
 fig.initialize()
-audio.start()
+graph.start()
 fig.start()
 matplotlib.pyplot.show()
 
-while 1:
-    time.sleep(0.1)
+# Closing the window ends the script
+fig.stop()
+graph.stop()
+graph.join()
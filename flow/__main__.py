@@ -0,0 +1,117 @@
+import argparse
+import sys
+
+
+
+def _decode(arguments):
+    from .batch import decodeFiles
+
+    receiver_parameters = {
+        "center": arguments.center,
+        "deviation": arguments.deviation,
+        "baud": arguments.baud,
+        "margin": arguments.margin,
+        "node_count": arguments.node_count,
+        "clock_node_count": arguments.clock_node_count,
+        "block_size": arguments.block_size,
+        "design": arguments.design,
+        }
+    framing_parameters = {
+        "sync": arguments.sync,
+        "sync_length": arguments.sync_length,
+        "message_length": arguments.message_length,
+        }
+
+    total_samples = 0
+    total_elapsed = 0
+    for stats in decodeFiles(
+            arguments.paths,
+            arguments.output,
+            jobs=arguments.jobs,
+            sample_rate=arguments.sample_rate,
+            raw_dtype=arguments.raw_dtype,
+            channel=arguments.channel,
+            channel_count=arguments.channel_count,
+            receiver_parameters=receiver_parameters,
+            framing_parameters=framing_parameters
+            ):
+        if "error" in stats:
+            print(f"{stats['file']}: {stats['error']}", file=sys.stderr)
+            continue
+        total_samples += stats["samples"]
+        total_elapsed += stats["elapsed"]
+        print(f"{stats['file']}: {stats['frames']} frames, {stats['duration']:.1f} s of audio in {stats['elapsed']:.2f} s ({stats['realtime_factor']:.1f}x realtime)")
+    if total_elapsed > 0:
+        print(f"{total_samples / total_elapsed / 1e6:.2f} Msamples/s per worker on average")
+
+
+
+def _sweep(arguments):
+    from .sweep import sweep, makeGrid
+
+    grid = makeGrid(arguments.snr, arguments.baud, arguments.deviation, arguments.node_count, arguments.clock_node_count)
+    options = {
+        "sample_rate": arguments.sample_rate,
+        "frame_count": arguments.frames,
+        "seed": arguments.seed,
+        "receiver_parameters": {"center": arguments.center, "design": arguments.design},
+        "framing_parameters": {"message_length": arguments.message_length},
+        }
+    for result in sweep(grid, arguments.output, jobs=arguments.jobs, **options):
+        name = f"snr {result['snr']} dB, baud {result['baud']}, deviation {result['deviation']}, taps {result['node_count']}/{result['clock_node_count']}"
+        if "error" in result:
+            print(f"{name}: {result['error']}", file=sys.stderr)
+            continue
+        ber = "-" if result["ber"] == None else f"{result['ber']:.2e}"
+        print(f"{name}: BER {ber}, FER {result['fer']:.2f}, {result['goodput']:.1f} bit/s, {result['cpu_load']:.2f} CPU")
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m flow")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    decode = commands.add_parser("decode", help="decode FSK frames from WAV or raw recordings")
+    decode.add_argument("paths", nargs="+", help="recordings or directories containing .wav/.raw files")
+    decode.add_argument("-o", "--output", default="decoded", help="directory for the decoded frames and stats.json")
+    decode.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (defaults to the CPU count)")
+    decode.add_argument("--center", type=float, default=800)
+    decode.add_argument("--deviation", type=float, default=190)
+    decode.add_argument("--baud", type=int, default=100)
+    decode.add_argument("--margin", type=float, default=None, help="demodulator filter transition width (defaults to 2 * (center - deviation))")
+    decode.add_argument("--node-count", type=int, default=2 ** 12, help="taps of the demodulator and low-pass filters")
+    decode.add_argument("--clock-node-count", type=int, default=2 ** 13, help="taps of the clock extractor filter")
+    decode.add_argument("--block-size", type=int, default=2 ** 16, help="samples processed per graph pull")
+    decode.add_argument("--design", choices=["linear", "minimum"], default="linear", help="filter design, minimum phase cuts the latency")
+    decode.add_argument("--sync", type=lambda value: int(value, 0), default=0xC1FA)
+    decode.add_argument("--sync-length", type=int, default=16)
+    decode.add_argument("--message-length", type=int, default=12, help="payload bytes per frame")
+    decode.add_argument("--sample-rate", type=int, default=None, help="sample rate of raw recordings")
+    decode.add_argument("--raw-dtype", default="int16", help="sample type of raw recordings")
+    decode.add_argument("--channel", type=int, default=0)
+    decode.add_argument("--channel-count", type=int, default=1, help="interleaved channels in raw recordings")
+    decode.set_defaults(handler=_decode)
+
+    sweep = commands.add_parser("sweep", help="simulate the FSK link over a noisy channel for a grid of parameters")
+    sweep.add_argument("-o", "--output", default="sweep", help="directory for results.csv and results.json")
+    sweep.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (defaults to the CPU count)")
+    sweep.add_argument("--snr", type=float, nargs="+", default=[-10, -5, 0, 5], help="SNR in dB over the whole sample rate")
+    sweep.add_argument("--baud", type=int, nargs="+", default=[100])
+    sweep.add_argument("--deviation", type=float, nargs="+", default=[190])
+    sweep.add_argument("--node-count", type=int, nargs="+", default=[2 ** 12], help="taps of the demodulator and low-pass filters")
+    sweep.add_argument("--clock-node-count", type=int, nargs="+", default=[2 ** 13], help="taps of the clock extractor filter")
+    sweep.add_argument("--center", type=float, default=800)
+    sweep.add_argument("--design", choices=["linear", "minimum"], default="linear")
+    sweep.add_argument("--message-length", type=int, default=12, help="payload bytes per frame")
+    sweep.add_argument("--frames", type=int, default=50, help="frames sent per configuration")
+    sweep.add_argument("--sample-rate", type=int, default=48000)
+    sweep.add_argument("--seed", type=int, default=0)
+    sweep.set_defaults(handler=_sweep)
+
+    arguments = parser.parse_args(argv)
+    arguments.handler(arguments)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from .nodes import BaseNode, Buffer
+from .basic import GracefulInputBuffer
+import asyncio
+import collections
+import threading
+
+
+
+def _wakeAll(waiters):
+    while waiters:
+        waiter = waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+
+class AsyncGracefulInputBuffer(GracefulInputBuffer):
+
+    def __init__(self, high_water, blocking=True):
+        super().__init__(blocking)
+
+        self.high_water = high_water
+        self.loop = None
+        self.waiters = collections.deque()
+        self.thread_lock = threading.Lock()
+        # The written count a blocked reader is waiting for, writes go past the high-water mark until it is reached
+        self.awaited_count = 0
+
+        self.outputs["samples"].addReadListener(self._onRead)
+
+    def getPendingCount(self):
+        return max((buffer.getSampleCount() for buffer in self.outputs["samples"].buffers.values()), default=0)
+
+    # Called on whichever graph thread consumed samples
+    def _onRead(self):
+        with self.thread_lock:
+            if self.waiters and not self._isFull():
+                self.loop.call_soon_threadsafe(_wakeAll, self.waiters)
+
+    def _isFull(self):
+        return self.getPendingCount() >= self.high_water and self.written_count >= self.awaited_count
+
+    def work(self, sample_count):
+        if self.blocking:
+            # Otherwise a reader blocked on more than the high-water mark and the writer would wait on each other
+            with self.thread_lock:
+                self.awaited_count = self.written_count + sample_count
+                if self.waiters:
+                    self.loop.call_soon_threadsafe(_wakeAll, self.waiters)
+        super().work(sample_count)
+
+    async def drain(self):
+        self.loop = asyncio.get_running_loop()
+        while True:
+            with self.thread_lock:
+                if not self._isFull():
+                    return
+                waiter = self.loop.create_future()
+                self.waiters.append(waiter)
+            await waiter
+
+    async def asyncWrite(self, samples):
+        await self.drain()
+        self.write(samples)
+
+
+
+class AsyncOutputBuffer(BaseNode):
+
+    def __init__(self, block_size, high_water=None):
+        super().__init__()
+        self.defineInput("samples")
+
+        self.block_size = block_size
+        self.high_water = high_water if high_water != None else 4 * block_size
+
+        self.loop = None
+        self.buffer = Buffer()
+        self.waiters = collections.deque()
+        self.space_available = threading.Condition()
+        # Counts that pending reads wait for, the buffer is filled past the high-water mark to satisfy larger ones
+        self.requested_counts = []
+
+    def _getFillTarget(self):
+        return max([self.high_water] + self.requested_counts)
+
+    def _threadLoop(self):
+        while not self.stopped.is_set():
+            with self.space_available:
+                while self.buffer.getSampleCount() >= self._getFillTarget() and not self.stopped.is_set():
+                    self.space_available.wait()
+            self.work(self.block_size)
+
+    def work(self, sample_count):
+        samples = self.inputs["samples"].read(sample_count)
+        with self.space_available:
+            self.buffer.write(samples)
+            if self.waiters:
+                self.loop.call_soon_threadsafe(_wakeAll, self.waiters)
+
+    def start(self):
+        super().start()
+        self._startThread(self._threadLoop)
+
+    def stop(self):
+        with self.space_available:
+            super().stop()
+            self.space_available.notify_all()
+
+    async def _take(self, minimum_count, maximum_count):
+        self.loop = asyncio.get_running_loop()
+        with self.space_available:
+            self.requested_counts.append(minimum_count)
+            self.space_available.notify()
+        try:
+            while True:
+                with self.space_available:
+                    available_count = self.buffer.getSampleCount()
+                    if available_count >= minimum_count:
+                        samples = self.buffer.read(min(available_count, maximum_count))
+                        self.space_available.notify()
+                        return samples
+                    waiter = self.loop.create_future()
+                    self.waiters.append(waiter)
+                await waiter
+        finally:
+            with self.space_available:
+                self.requested_counts.remove(minimum_count)
+
+    async def read(self, sample_count):
+        return await self._take(1, sample_count)
+
+    async def readexactly(self, sample_count):
+        return await self._take(sample_count, sample_count)
+
+    async def frames(self, frame_size):
+        while True:
+            yield await self._take(frame_size, frame_size)
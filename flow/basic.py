@@ -2,6 +2,8 @@ from .nodes import BaseNode, Buffer
 import numpy
 import math
 import threading
+import queue
+import mmap
 
 
 
@@ -13,14 +15,13 @@ class NullSink(BaseNode):
         
         self.block_size = block_size
 
-        self.thread = threading.Thread(target=self._loop)
-
     def _loop(self):
-        while True:
+        while not self.stopped.is_set():
             self.inputs["samples"].read(self.block_size)
     
     def start(self):
-        self.thread.start()
+        super().start()
+        self._startThread(self._loop)
 
 
 
@@ -32,13 +33,11 @@ class Clock(BaseNode):
         self.defineOutput("time")
         
         self.sample_rate = sample_rate
-        self.current_time = offset
+        self.offset = offset
 
     def work(self, sample_count):
-        last_sample_time = self.current_time + (sample_count - 1) / self.sample_rate
-        time_points = numpy.linspace(self.current_time, last_sample_time, sample_count)
+        time_points = self.outputs["time"].getSampleIndices(sample_count) / self.sample_rate + self.offset
         self.outputs["time"].write(time_points)
-        self.current_time += sample_count / self.sample_rate
 
 
 
@@ -83,20 +82,21 @@ class Deinterleaver(BaseNode):
 
 class NearestNeighbourResampler(BaseNode):
 
+    state_attributes = ("current_index", "last_sample")
+
     def __init__(self, output_ratio):
         super().__init__()
 
         self.defineInput("original")
         self.defineOutput("resampled")
 
-        self.index_counter = Clock(output_ratio)
-        self.index_counter.outputs["time"].registerConsumer(self)
+        self.output_ratio = output_ratio
 
         self.current_index = -1
         self.last_sample = 0
 
     def work(self, sample_count):
-        counter = self.index_counter.outputs["time"].read(sample_count, self)
+        counter = self.outputs["resampled"].getSampleIndices(sample_count) / self.output_ratio
         indices = numpy.round(counter).astype(numpy.int64) - self.current_index
         input_amount = max(indices)
         new_samples = self.inputs["original"].read(input_amount)
@@ -110,20 +110,21 @@ class NearestNeighbourResampler(BaseNode):
 
 class PulseResampler(BaseNode):
 
+    state_attributes = ("current_index", "last_sample")
+
     def __init__(self, output_ratio):
         super().__init__()
 
         self.defineInput("original")
         self.defineOutput("resampled")
 
-        self.index_counter = Clock(output_ratio)
-        self.index_counter.outputs["time"].registerConsumer(self)
+        self.output_ratio = output_ratio
 
         self.current_index = -1
         self.last_sample = 0
 
     def work(self, sample_count):
-        counter = self.index_counter.outputs["time"].read(sample_count, self)
+        counter = self.outputs["resampled"].getSampleIndices(sample_count) / self.output_ratio
         indices = numpy.round(counter).astype(numpy.int64) - self.current_index
         input_amount = max(indices)
         new_samples = self.inputs["original"].read(input_amount)
@@ -135,21 +136,64 @@ class PulseResampler(BaseNode):
 
 
 
+class ArraySource(BaseNode):
+
+    state_attributes = ("position",)
+
+    def __init__(self, samples):
+        super().__init__()
+        self.defineOutput("samples")
+
+        self.samples = samples
+        self.position = 0
+
+    def work(self, sample_count):
+        chunk = self.samples[self.position:self.position + sample_count]
+        padding = numpy.zeros(sample_count - len(chunk), dtype=self.samples.dtype)
+        self.position += sample_count
+        self.outputs["samples"].write(numpy.concatenate([chunk, padding]))
+
+    def getRemainingCount(self):
+        return max(0, len(self.samples) - self.position)
+
+
+
 class GracefulInputBuffer(BaseNode):
 
-    def __init__(self):
+    def __init__(self, blocking=True):
         super().__init__()
         self.defineOutput("samples")
         self.defineOutput("present")
+
+        # A blocking buffer makes readers wait for written data instead of spinning on generated silence;
+        # a non-blocking one suits links paced elsewhere, like a sound card that has to keep playing between frames
+        self.blocking = blocking
+        self.data_written = threading.Condition()
+        self.written_count = 0
     
     def work(self, sample_count):
-        fallback = numpy.zeros(sample_count)
-        self.outputs["samples"].write(fallback)
-        self.outputs["present"].write(numpy.zeros_like(fallback))
+        if self.blocking:
+            with self.data_written:
+                target_count = self.written_count + sample_count
+                while self.written_count < target_count and not self.stopped.is_set():
+                    self.data_written.wait()
+                sample_count = target_count - self.written_count
+        if sample_count > 0:
+            fallback = numpy.zeros(sample_count)
+            self.outputs["samples"].write(fallback)
+            self.outputs["present"].write(numpy.zeros_like(fallback))
 
     def write(self, samples):
-        self.outputs["samples"].write(samples)
-        self.outputs["present"].write(numpy.ones_like(samples))
+        with self.data_written:
+            self.outputs["samples"].write(samples)
+            self.outputs["present"].write(numpy.ones_like(samples))
+            self.written_count += len(samples)
+            self.data_written.notify_all()
+
+    def stop(self):
+        with self.data_written:
+            super().stop()
+            self.data_written.notify_all()
 
 
 
@@ -171,7 +215,6 @@ class Recorder(BaseNode):
         self.defineInput("audio")
         self.block_size = block_size
         self.recording_done = threading.Condition()
-        self.thread = threading.Thread(target=self._threadLoop)
         self.record_count = 0
         self.buffer = Buffer()
 
@@ -187,16 +230,245 @@ class Recorder(BaseNode):
                 self.recording_done.release()
 
     def _threadLoop(self):
-        while True:
+        while not self.stopped.is_set():
             self.work(self.block_size)
     
     def start(self):
-        self.thread.start()
+        super().start()
+        self._startThread(self._threadLoop)
+
+    def stop(self):
+        with self.recording_done:
+            super().stop()
+            self.recording_done.notify_all()
 
     def record(self, sample_count):
         self.recording_done.acquire()
         self.record_count = sample_count
-        self.recording_done.wait()
+        while self.record_count > 0 and not self.stopped.is_set():
+            self.recording_done.wait()
+        self.record_count = 0
         samples = self.buffer.read(sample_count)
         self.recording_done.release()
-        return samples
\ No newline at end of file
+        return samples
+
+
+
+class TriggeredRecorder(BaseNode):
+
+    def __init__(self, block_size, pretrigger_size, capture_size, threshold, window_size, path=None):
+        super().__init__()
+        self.defineInput("audio")
+
+        self.block_size = block_size
+        self.pretrigger_size = pretrigger_size
+        self.capture_size = capture_size
+        self.threshold = threshold
+        self.window_size = window_size
+        self.path = path
+
+        self.ring = numpy.zeros(pretrigger_size)
+        self.ring_index = 0
+        self.energy_history = numpy.zeros(window_size - 1)
+
+        self.capture_done = threading.Condition()
+        self.armed = False
+        self.capture_array = None
+        self.capture_fill = 0
+        self.capture_count = 0
+
+    def _allocateCapture(self):
+        total_size = self.pretrigger_size + self.capture_size
+        if self.path == None:
+            return numpy.zeros(total_size)
+        # Long captures go straight to disk, the path may contain {} for the capture number
+        path = str(self.path).format(self.capture_count)
+        return numpy.memmap(path, dtype=numpy.float64, mode="w+", shape=(total_size,))
+
+    def _findTrigger(self, samples):
+        squared = numpy.concatenate([self.energy_history, numpy.square(samples.real)])
+        self.energy_history = squared[len(squared) - (self.window_size - 1):]
+        summed = numpy.cumsum(squared)
+        summed = numpy.insert(summed, 0, 0)
+        energy = (summed[self.window_size:] - summed[:-self.window_size]) / self.window_size
+        above = numpy.flatnonzero(energy > self.threshold)
+        return above[0] if len(above) > 0 else None
+
+    def _ringContents(self):
+        return numpy.roll(self.ring, -self.ring_index)
+
+    def _pushRing(self, samples):
+        if self.pretrigger_size == 0:
+            return
+        samples = samples[len(samples) - min(len(samples), self.pretrigger_size):]
+        indices = (self.ring_index + numpy.arange(len(samples))) % self.pretrigger_size
+        self.ring[indices] = samples.real
+        self.ring_index = (self.ring_index + len(samples)) % self.pretrigger_size
+
+    def _append(self, samples):
+        amount = min(len(samples), len(self.capture_array) - self.capture_fill)
+        self.capture_array[self.capture_fill:self.capture_fill + amount] = samples[:amount].real
+        self.capture_fill += amount
+        if self.capture_fill == len(self.capture_array):
+            if isinstance(self.capture_array, numpy.memmap):
+                self.capture_array.flush()
+            self.armed = False
+            self.capture_done.notify_all()
+
+    def work(self, sample_count):
+        samples = self.inputs["audio"].read(sample_count)
+        trigger_index = self._findTrigger(samples)
+        with self.capture_done:
+            if self.armed and self.capture_fill == 0 and trigger_index != None:
+                history = numpy.concatenate([self._ringContents(), samples[:trigger_index].real])
+                self.capture_array[:self.pretrigger_size] = history[len(history) - self.pretrigger_size:]
+                self.capture_fill = self.pretrigger_size
+                self._append(samples[trigger_index:])
+            elif self.armed and self.capture_fill > 0:
+                self._append(samples)
+        self._pushRing(samples)
+
+    def _threadLoop(self):
+        while not self.stopped.is_set():
+            self.work(self.block_size)
+
+    def start(self):
+        super().start()
+        self._startThread(self._threadLoop)
+
+    def stop(self):
+        with self.capture_done:
+            super().stop()
+            self.capture_done.notify_all()
+
+    def arm(self):
+        with self.capture_done:
+            self.capture_array = self._allocateCapture()
+            self.capture_fill = 0
+            self.capture_count += 1
+            self.armed = True
+
+    def wait(self, timeout=None):
+        with self.capture_done:
+            self.capture_done.wait_for(lambda: not self.armed or self.stopped.is_set(), timeout)
+            if self.armed:
+                return None
+            return self.capture_array[:self.capture_fill]
+
+    def capture(self, timeout=None):
+        self.arm()
+        return self.wait(timeout)
+
+
+
+class AppendableArrayFile:
+
+    NPY_HEADER_SIZE = 128
+
+    def __init__(self, path, dtype, growth_size=2 ** 26):
+        # A .npy path gets a fixed-size header that is filled in on close, anything else is written raw
+        self.path = str(path)
+        self.dtype = numpy.dtype(dtype)
+        self.growth_size = growth_size
+        self.header_size = self.NPY_HEADER_SIZE if self.path.endswith(".npy") else 0
+        self.sample_count = 0
+
+        self.file = open(self.path, "w+b")
+        self.file.write(self._header())
+        self.file_size = self.header_size
+        self.map = None
+
+    def _header(self):
+        if self.header_size == 0:
+            return b""
+        description = f"{{'descr': {self.dtype.str!r}, 'fortran_order': False, 'shape': ({self.sample_count},), }}"
+        padding = self.header_size - 10 - len(description) - 1
+        return b"\x93NUMPY\x01\x00" + (self.header_size - 10).to_bytes(2, "little") + description.encode() + b" " * padding + b"\n"
+
+    def _grow(self, needed_size):
+        # The file grows in large steps and is mapped again, so appends stay plain memory copies
+        if self.map != None:
+            self.map.close()
+        self.file_size = max(needed_size, self.file_size + self.growth_size)
+        self.file.truncate(self.file_size)
+        self.map = mmap.mmap(self.file.fileno(), self.file_size)
+
+    def append(self, samples):
+        samples = numpy.asarray(samples, dtype=self.dtype)
+        offset = self.header_size + self.sample_count * self.dtype.itemsize
+        end = offset + samples.nbytes
+        if end > self.file_size:
+            self._grow(end)
+        numpy.frombuffer(self.map, dtype=self.dtype, count=len(samples), offset=offset)[:] = samples
+        self.sample_count += len(samples)
+
+    def close(self):
+        if self.map != None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        self.file.truncate(self.header_size + self.sample_count * self.dtype.itemsize)
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+
+
+class DiskTap(BaseNode):
+
+    def __init__(self, path, dtype=None, queue_size=64, blocking=False):
+        super().__init__()
+        self.defineInput("samples")
+        self.defineOutput("samples")
+
+        # The file type is fixed by the first block unless given, so a complex edge has to be tapped as complex
+        self.path = path
+        self.dtype = dtype
+        self.blocking = blocking
+        self.queue = queue.Queue(queue_size)
+        self.writer = None
+        self.dropped_count = 0
+
+    def work(self, sample_count):
+        samples = self.inputs["samples"].read(sample_count)
+        # The output buffer keeps its own copy, so the block itself can be handed to the writer thread untouched
+        self.outputs["samples"].write(samples)
+        try:
+            self.queue.put(samples, block=self.blocking)
+        except queue.Full:
+            self.dropped_count += len(samples)
+
+    def _writeLoop(self):
+        while True:
+            try:
+                samples = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                # stop() couldn't queue the sentinel into a full queue, which has been drained by now
+                if self.stopped.is_set():
+                    break
+                continue
+            if samples is None:
+                break
+            if self.writer == None:
+                self.writer = AppendableArrayFile(self.path, self.dtype or samples.dtype)
+            self.writer.append(samples)
+        if self.writer != None:
+            self.writer.close()
+            self.writer = None
+
+    def start(self):
+        if self.thread != None:
+            # Starting again would truncate the file the first run wrote
+            raise RuntimeError(f"{self.path} has already been written, a DiskTap can't be restarted")
+        super().start()
+        self._startThread(self._writeLoop)
+
+    def stop(self):
+        super().stop()
+        if self.thread == None:
+            return
+        # Everything queued before the sentinel still makes it to disk
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
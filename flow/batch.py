@@ -0,0 +1,232 @@
+from .nodes import NodeInput
+from .basic import ArraySource
+from .dsp import FrequencyDemodulator, LowPassFilter, ClockExtractor, Delay, getClockDelay
+from . import kernels
+import concurrent.futures
+import collections
+import numpy
+import pathlib
+import json
+import time
+import wave
+
+
+
+RECEIVER_DEFAULTS = {
+    "center": 800,
+    "deviation": 190,
+    "baud": 100,
+    "margin": None,
+    "node_count": 2 ** 12,
+    "clock_node_count": 2 ** 13,
+    "block_size": 2 ** 16,
+    "design": "linear",
+    }
+
+FRAMING_DEFAULTS = {
+    "sync": 0xC1FA,
+    "sync_length": 16,
+    "message_length": 12,
+    }
+
+
+
+class Receiver:
+
+    def __init__(self, source, sample_rate, center, deviation, baud, margin, node_count, clock_node_count, block_size, design="linear"):
+        if margin == None:
+            margin = 2 * center - 2 * deviation
+
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+
+        self.demod = FrequencyDemodulator(center, deviation, 2 * (2 * deviation), margin, node_count, sample_rate, design)
+        self.low = LowPassFilter(baud / 2, baud / 2, node_count, sample_rate, design)
+        self.ck = ClockExtractor(baud, baud * 0.1, clock_node_count, sample_rate, design)
+        self.ckdel = Delay(getClockDelay(self.demod, self.low, self.ck, baud, sample_rate))
+
+        self.demod.inputs["modulated"].assignProducer(source)
+        self.low.inputs["original"].assignProducer(self.demod.outputs["baseband"])
+        self.ck.inputs["signal"].assignProducer(self.low.outputs["filtered"])
+        self.ckdel.inputs["original"].assignProducer(self.ck.outputs["clock"])
+
+        # Sampling is done here rather than with ClockedSampler so every pull is a fixed, large block
+        self.data = NodeInput()
+        self.data.assignProducer(self.low.outputs["filtered"])
+        self.clock = NodeInput()
+        self.clock.assignProducer(self.ckdel.outputs["delayed"])
+        self.last_clock = 1
+
+        self.flush_count = node_count + clock_node_count + self.ckdel.buffer.getSampleCount()
+
+    def readSymbols(self):
+        data = self.data.read(self.block_size)
+        clock = self.clock.read(self.block_size)
+        symbols = kernels.sampleRisingEdges(data, clock, self.last_clock)
+        self.last_clock = clock[-1]
+        return symbols
+
+
+
+def readRecording(path, sample_rate=None, raw_dtype="int16", channel=0, channel_count=1):
+    path = pathlib.Path(path)
+    if path.suffix.lower() == ".wav":
+        with wave.open(str(path), "rb") as recording:
+            sample_width = recording.getsampwidth()
+            channel_count = recording.getnchannels()
+            sample_rate = recording.getframerate()
+            frames = recording.readframes(recording.getnframes())
+        if sample_width == 1:
+            samples = numpy.frombuffer(frames, dtype=numpy.uint8).astype(numpy.int16) - 128
+            type_range = (-128, 127)
+        else:
+            data_type = {2: numpy.int16, 4: numpy.int32}[sample_width]
+            samples = numpy.frombuffer(frames, dtype=data_type)
+            type_range = (numpy.iinfo(data_type).min, numpy.iinfo(data_type).max)
+    else:
+        if sample_rate == None:
+            raise ValueError(f"{path}: raw recordings need an explicit sample rate")
+        data_type = numpy.dtype(raw_dtype)
+        samples = numpy.fromfile(path, dtype=data_type)
+        if data_type.kind == "f":
+            type_range = (-1, 1)
+        else:
+            type_range = (numpy.iinfo(data_type).min, numpy.iinfo(data_type).max)
+
+    samples = samples[channel::channel_count]
+    normalized = numpy.interp(samples, type_range, [-1, 1])
+    return normalized, sample_rate
+
+
+
+def extractFrames(symbols, sync, sync_length, message_length):
+    chips = (symbols > 0).astype(numpy.uint8)
+    sync_bits = (sync >> numpy.arange(sync_length - 1, -1, -1)) & 1
+    frame_length = sync_length + message_length * 8
+
+    frames = []
+    for offset in range(2):
+        pairs = chips[offset:offset + (len(chips) - offset) // 2 * 2].reshape(-1, 2)
+        if len(pairs) < frame_length:
+            continue
+        bits = pairs[:, 0]
+        invalid = pairs[:, 0] == pairs[:, 1]
+        windows = numpy.lib.stride_tricks.sliding_window_view(bits, sync_length)
+        matches = numpy.flatnonzero(numpy.all(windows == sync_bits, axis=1))
+        matches = matches[matches + frame_length <= len(bits)]
+        for index in matches:
+            payload = bits[index + sync_length:index + frame_length]
+            frames.append({
+                "symbol": offset + 2 * int(index),
+                "payload": numpy.packbits(payload).tobytes(),
+                "invalid_pairs": int(numpy.sum(invalid[index:index + frame_length])),
+                })
+
+    # A frame can show up in both Manchester alignments, keep the cleaner copy
+    frames.sort(key=lambda frame: frame["symbol"])
+    unique = []
+    for frame in frames:
+        if unique and frame["symbol"] - unique[-1]["symbol"] < 2:
+            if frame["invalid_pairs"] < unique[-1]["invalid_pairs"]:
+                unique[-1] = frame
+            continue
+        unique.append(frame)
+    return unique
+
+
+
+def decodeSamples(samples, sample_rate, receiver_parameters):
+    source = ArraySource(samples)
+    receiver = Receiver(source.outputs["samples"], sample_rate, **receiver_parameters)
+    blocks = []
+    while source.position < len(samples) + receiver.flush_count:
+        blocks.append(receiver.readSymbols())
+    return numpy.concatenate(blocks)
+
+
+
+def decodeFile(path, sample_rate=None, raw_dtype="int16", channel=0, channel_count=1, receiver_parameters=None, framing_parameters=None):
+    receiver_parameters = {**RECEIVER_DEFAULTS, **(receiver_parameters or {})}
+    framing_parameters = {**FRAMING_DEFAULTS, **(framing_parameters or {})}
+
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    samples, sample_rate = readRecording(path, sample_rate, raw_dtype, channel, channel_count)
+    symbols = decodeSamples(samples, sample_rate, receiver_parameters)
+    frames = extractFrames(symbols, **framing_parameters)
+    elapsed = time.perf_counter() - start_time
+    cpu_time = time.process_time() - start_cpu
+
+    duration = len(samples) / sample_rate
+    stats = {
+        "file": str(path),
+        "sample_rate": sample_rate,
+        "samples": len(samples),
+        "duration": duration,
+        "elapsed": elapsed,
+        "cpu_time": cpu_time,
+        "realtime_factor": duration / elapsed if elapsed > 0 else None,
+        "samples_per_second": len(samples) / elapsed if elapsed > 0 else None,
+        "symbols": len(symbols),
+        "frames": len(frames),
+        }
+    return frames, stats
+
+
+
+def findRecordings(paths, suffixes=(".wav", ".raw")):
+    # Returns (path, output name) pairs, recordings found in a directory are named after their path below it
+    recordings = []
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            children = sorted(child for child in path.rglob("*") if child.suffix.lower() in suffixes)
+            recordings.extend((child, child.relative_to(path).with_suffix(".frames.jsonl")) for child in children)
+        else:
+            recordings.append((path, pathlib.Path(path.stem + ".frames.jsonl")))
+
+    output_names = collections.Counter(output_name for _, output_name in recordings)
+    duplicates = sorted(str(output_name) for output_name, count in output_names.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Several recordings would be written to {', '.join(duplicates)}")
+    return recordings
+
+
+
+def _writeFrames(path, frames, symbol_rate):
+    with open(path, "w") as frame_file:
+        for frame in frames:
+            record = {
+                "time": frame["symbol"] / symbol_rate,
+                "payload": frame["payload"].hex(),
+                "text": frame["payload"].decode(errors="replace"),
+                "invalid_pairs": frame["invalid_pairs"],
+                }
+            frame_file.write(json.dumps(record) + "\n")
+
+
+
+def decodeFiles(paths, output_directory, jobs=None, **options):
+    output_directory = pathlib.Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+    recordings = findRecordings(paths)
+    baud = {**RECEIVER_DEFAULTS, **(options.get("receiver_parameters") or {})}["baud"]
+
+    all_stats = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(decodeFile, path, **options): (path, output_name) for path, output_name in recordings}
+        for future in concurrent.futures.as_completed(futures):
+            path, output_name = futures[future]
+            try:
+                frames, stats = future.result()
+            except Exception as error:
+                stats = {"file": str(path), "error": repr(error)}
+            else:
+                frames_path = output_directory / output_name
+                frames_path.parent.mkdir(parents=True, exist_ok=True)
+                _writeFrames(frames_path, frames, baud)
+            all_stats.append(stats)
+            yield stats
+
+    all_stats.sort(key=lambda stats: stats["file"])
+    with open(output_directory / "stats.json", "w") as stats_file:
+        json.dump(all_stats, stats_file, indent=4)
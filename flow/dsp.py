@@ -1,8 +1,32 @@
 import numpy
-import scipy.signal
 import math
-from .nodes import Buffer, BaseNode
-from .basic import Clock
+from .nodes import Buffer, BaseNode, ElementwiseNode
+from . import kernels
+
+
+
+def _signal():
+    # scipy.signal takes most of the import time of this module, so it is only loaded once a filter is built
+    import scipy.signal
+    return scipy.signal
+
+
+
+def _multiply(signal1, signal2):
+    product_type = numpy.result_type(signal1, signal2)
+    if signal1.dtype == product_type:
+        return numpy.multiply(signal1, signal2, out=signal1)
+    if signal2.dtype == product_type:
+        return numpy.multiply(signal1, signal2, out=signal2)
+    return signal1 * signal2
+
+
+
+def _lfilter(coefficients, samples, state):
+    # A FIR filter whose state is all zeros stays silent on silent input, so squelched blocks skip the convolution
+    if not samples.any() and not state.any():
+        return numpy.zeros(len(samples), dtype=numpy.result_type(coefficients, samples)), state
+    return _signal().lfilter(coefficients, 1, samples, zi=state)
 
 
 
@@ -13,15 +37,14 @@ class Oscillator(BaseNode):
         
         self.defineOutput("sine")
 
-        self.clock = Clock(sample_rate)
-        self.clock.outputs["time"].registerConsumer(self)
+        self.sample_rate = sample_rate
 
         self.frequency = frequency
 
     def work(self, sample_count):
-        time_points = self.clock.outputs["time"].read(sample_count, self)
-        oscillator_i = numpy.cos(time_points * 2 * numpy.pi * self.frequency)
-        oscillator_q = numpy.sin(time_points * 2 * numpy.pi * self.frequency)
+        phase = self.outputs["sine"].getSampleIndices(sample_count) * (2 * numpy.pi * self.frequency / self.sample_rate)
+        oscillator_i = numpy.cos(phase)
+        oscillator_q = numpy.sin(phase)
         oscillator = oscillator_i + 1j * oscillator_q
         self.outputs["sine"].write(oscillator)
 
@@ -29,14 +52,17 @@ class Oscillator(BaseNode):
 
 class RandomSymbolSource(BaseNode):
 
-    def __init__(self, symbol_count):
+    state_attributes = ("random",)
+
+    def __init__(self, symbol_count, seed=None):
         super().__init__()
         self.defineOutput("symbols")
 
         self.symbol_count = symbol_count
+        self.random = numpy.random.default_rng(seed)
 
     def work(self, sample_count):
-        randint = numpy.random.randint(0, self.symbol_count, sample_count)
+        randint = self.random.integers(0, self.symbol_count, sample_count)
         normalized = 2 * randint / (self.symbol_count - 1) - 1
         self.outputs["symbols"].write(normalized)
 
@@ -44,6 +70,8 @@ class RandomSymbolSource(BaseNode):
 
 class VariableFrequencyOscillator(BaseNode):
 
+    state_attributes = ("last_phase",)
+
     def __init__(self, sample_rate, continuous_phase):
         super().__init__()
         self.defineInput("frequency")
@@ -51,22 +79,20 @@ class VariableFrequencyOscillator(BaseNode):
 
         self.continuous_phase = continuous_phase
         self.last_phase = 0
-        self.last_time = 0
         
-        self.clock = Clock(sample_rate)
-        self.clock.outputs["time"].registerConsumer(self)
+        self.sample_rate = sample_rate
 
     def work(self, sample_count):
         frequency = self.inputs["frequency"].read(sample_count)
-        time_points = self.clock.outputs["time"].read(sample_count, self)
         if self.continuous_phase:
-            time_deltas = numpy.diff(numpy.insert(time_points, 0, self.last_time))
-            self.last_time = time_points[-1]
-            phase_deltas = time_deltas * 2 * numpy.pi * frequency
-            phase = numpy.cumsum(phase_deltas) + self.last_phase
-            self.last_phase = phase[-1]
+            # Samples are evenly spaced, only the very first one has no predecessor and so no time step
+            time_deltas = numpy.full(sample_count, 1 / self.sample_rate)
+            if self.outputs["sine"].position == 0 and sample_count > 0:
+                time_deltas[0] = 0
+            phase = kernels.integratePhase(frequency, time_deltas, self.last_phase)
+            self.last_phase = phase[-1] % (2 * numpy.pi)
         else:
-            phase = time_points * 2 * numpy.pi * frequency
+            phase = self.outputs["sine"].getSampleIndices(sample_count) * (2 * numpy.pi / self.sample_rate) * frequency
         oscillator_i = numpy.cos(phase)
         oscillator_q = numpy.sin(phase)
         oscillator = oscillator_i + 1j * oscillator_q
@@ -98,7 +124,7 @@ class SineFrequencyModulator(BaseNode):
 
 class FrequencyDemodulator(BaseNode):
 
-    def __init__(self, center_frequency, deviation, band_width, margin, node_count, sample_rate):
+    def __init__(self, center_frequency, deviation, band_width, margin, node_count, sample_rate, design="linear"):
         super().__init__()
         self.defineInput("modulated")
         self.defineOutput("baseband")
@@ -108,7 +134,7 @@ class FrequencyDemodulator(BaseNode):
 
         self.shifter = FrequencyShifter(-center_frequency, sample_rate)
 
-        self.filter = LowPassFilter(band_width / 2, margin, node_count, sample_rate)
+        self.filter = LowPassFilter(band_width / 2, margin, node_count, sample_rate, design)
         self.filter.inputs["original"].assignProducer(self.shifter.outputs["shifted"])
         self.filter.outputs["filtered"].registerConsumer(self)
 
@@ -126,15 +152,62 @@ class FrequencyDemodulator(BaseNode):
         baseband = frequency / self.deviation
         self.outputs["baseband"].write(baseband)
 
+    def getGroupDelay(self):
+        # The phase difference between neighbouring samples adds half a sample on top of the filter
+        return self.filter.getGroupDelay() + 0.5
+
+
+
+class ToneDemodulator(BaseNode):
+
+    state_attributes = ("sample_index", "history")
+
+    def __init__(self, low_frequency, high_frequency, window_size, decimation, sample_rate):
+        super().__init__()
+        self.defineInput("modulated")
+        self.defineOutput("baseband")
+
+        self.window_size = window_size
+        self.decimation = decimation
+        self.sample_rate = sample_rate
+        self.frequencies = numpy.array([low_frequency, high_frequency])[:, None]
+
+        self.sample_index = 0
+        self.history = numpy.zeros((2, window_size), dtype=complex)
+
+    def work(self, sample_count):
+        input_amount = sample_count * self.decimation
+        modulated = self.inputs["modulated"].read(input_amount)
+
+        # Cycles are reduced modulo 1 before scaling so the phase stays exact on long runs
+        indices = self.sample_index + numpy.arange(input_amount)
+        cycles = numpy.mod(self.frequencies * indices, self.sample_rate) / self.sample_rate
+        mixed = numpy.exp(-2j * numpy.pi * cycles) * modulated
+        self.sample_index += input_amount
+
+        extended = numpy.concatenate([self.history, mixed], axis=1)
+        summed = numpy.cumsum(extended, axis=1)
+        self.history = extended[:, -self.window_size:]
+
+        # Sliding sums over the last window_size samples, evaluated only at the decimated positions
+        positions = self.window_size + numpy.arange(self.decimation - 1, input_amount, self.decimation)
+        windowed = summed[:, positions] - summed[:, positions - self.window_size]
+        power = numpy.square(numpy.absolute(windowed))
+        baseband = (power[1] - power[0]) / numpy.maximum(power[1] + power[0], 1e-30)
+        self.outputs["baseband"].write(baseband)
+
 
 
 class Delay(BaseNode):
 
+    state_attributes = ("buffer",)
+
     def __init__(self, amount):
         super().__init__()
         self.defineInput("original")
         self.defineOutput("delayed")
         
+        self.amount = amount
         self.buffer = Buffer()
         self.buffer.write(numpy.zeros(amount))
 
@@ -144,168 +217,311 @@ class Delay(BaseNode):
         delayed = self.buffer.read(sample_count)
         self.outputs["delayed"].write(delayed)
 
+    def getGroupDelay(self):
+        return self.amount
+
 
 
-class FrequencyShifter(BaseNode):
+class FrequencyShifter(ElementwiseNode):
 
     def __init__(self, shift_amount, sample_rate):
-        super().__init__()
-        self.defineInput("original")
-        self.defineOutput("shifted")
+        super().__init__(["original"], "shifted")
         
         self.oscillator = Oscillator(-shift_amount, sample_rate)
         self.oscillator.outputs["sine"].registerConsumer(self)
 
-    def work(self, sample_count):
-        oscillator = self.oscillator.outputs["sine"].read(sample_count, self)
-        original = self.inputs["original"].read(sample_count)
-        shifted = oscillator * original
-        self.outputs["shifted"].write(shifted)
+    def kernel(self, original):
+        oscillator = self.oscillator.outputs["sine"].read(len(original), self)
+        return _multiply(oscillator, original)
 
 
 
-class AmplitudeModulator(BaseNode):
+class AmplitudeModulator(ElementwiseNode):
 
     def __init__(self):
-        super().__init__()
-        self.defineInput("signal 1")
-        self.defineInput("signal 2")
-        self.defineOutput("modulated")
+        super().__init__(["signal 1", "signal 2"], "modulated")
 
-    def work(self, sample_count):
-        signal1 = self.inputs["signal 1"].read(sample_count)
-        signal2 = self.inputs["signal 2"].read(sample_count)
-        modulated = signal1 * signal2
-        self.outputs["modulated"].write(modulated)
+    def kernel(self, signal1, signal2):
+        return _multiply(signal1, signal2)
+
+
+
+class Scaler(ElementwiseNode):
+
+    def __init__(self, factor):
+        super().__init__(["original"], "scaled")
 
+        self.factor = factor
 
+    def kernel(self, original):
+        if numpy.result_type(original, self.factor) == original.dtype:
+            return numpy.multiply(original, self.factor, out=original)
+        return original * self.factor
 
-class ManchesterCoder(BaseNode):
+
+
+class AWGNChannel(ElementwiseNode):
+
+    state_attributes = ("random",)
+
+    def __init__(self, snr, signal_power=1, real=False, seed=None):
+        super().__init__(["original"], "noisy")
+
+        # snr is in dB over the whole sample rate, relative to signal_power
+        self.noise_power = signal_power / 10 ** (snr / 10)
+        self.real = real
+        self.random = numpy.random.default_rng(seed)
+
+    def kernel(self, original):
+        if self.real:
+            # Only the real part makes it through a sound card, as in AudioIO
+            original = original.real
+        if numpy.iscomplexobj(original):
+            deviation = math.sqrt(self.noise_power / 2)
+            noise = self.random.normal(0, deviation, len(original)) + 1j * self.random.normal(0, deviation, len(original))
+        else:
+            noise = self.random.normal(0, math.sqrt(self.noise_power), len(original))
+        return original + noise
+
+
+
+class ManchesterCoder(ElementwiseNode):
 
     def __init__(self, low_to_high_zero):
-        super().__init__()
-        self.defineInput("decoded")
-        self.defineOutput("encoded")
+        super().__init__(["decoded"], "encoded", 2)
 
         self.low_to_high_zero = low_to_high_zero
 
-    def work(self, sample_count):
-        input_amount = math.ceil(sample_count / 2)
-        samples = self.inputs["decoded"].read(input_amount)
-        encoded = numpy.empty(input_amount * 2)
+    def kernel(self, samples):
+        encoded = numpy.empty(len(samples) * 2)
         if self.low_to_high_zero:
             encoded[0::2] = -samples
             encoded[1::2] = samples
         else:
             encoded[0::2] = samples
             encoded[1::2] = -samples
-        self.outputs["encoded"].write(encoded)
+        return encoded
 
 
 
-class LowPassFilter(BaseNode):
-
-    def __init__(self, cutoff_frequency, transition_width, node_count, sample_rate):
-        super().__init__()
-        self.defineInput("original")
-        self.defineOutput("filtered")
-        
-        frequencies = [0, cutoff_frequency, cutoff_frequency + transition_width, sample_rate / 2]
-        gain = [1, 1, 0, 0]
-        self.coefficients = scipy.signal.firwin2(node_count, frequencies, gain, fs=sample_rate)
-        self.filter_state = numpy.zeros(node_count - 1)
+def _sosfilter(sections, samples, state):
+    if not samples.any() and not state.any():
+        return numpy.zeros(len(samples), dtype=numpy.result_type(sections, samples)), state
+    return _signal().sosfilt(sections, samples, zi=state)
 
-    def work(self, sample_count):
-        signal = self.inputs["original"].read(sample_count)
-        filtered, self.filter_state = scipy.signal.lfilter(self.coefficients, 1, signal, zi=self.filter_state)
-        self.outputs["filtered"].write(filtered)
 
 
+class _FilterNode(BaseNode):
 
-class Filter(BaseNode):
+    state_attributes = ("filter_state",)
+    DESIGNS = ("linear", "minimum", "butterworth", "elliptic")
 
-    def __init__(self, frequencies, gain, node_count, sample_rate):
+    def __init__(self, input_key, design, sample_rate, reference_frequency):
         super().__init__()
-        self.defineInput("unfiltered")
+        self.defineInput(input_key)
         self.defineOutput("filtered")
-        
-        self.coefficients = scipy.signal.firwin2(node_count, frequencies, gain, fs=sample_rate)
-        self.filter_state = numpy.zeros(node_count - 1)
+        if design not in self.DESIGNS:
+            raise ValueError(f"Unknown filter design {design!r}")
+
+        self.input_key = input_key
+        self.design = design
+        self.sample_rate = sample_rate
+        self.reference_frequency = reference_frequency
+        self.coefficients = None
+        self.sections = None
+
+    def _designFIR(self, frequencies, gain, node_count):
+        if self.design == "linear":
+            self.coefficients = _signal().firwin2(node_count, frequencies, gain, fs=self.sample_rate)
+        elif self.design == "minimum":
+            # The homomorphic method halves the length and takes the square root of the magnitude,
+            # so it starts from a filter twice as long with the squared gain
+            prototype = _signal().firwin2(2 * node_count - 1, frequencies, numpy.square(gain), fs=self.sample_rate)
+            self.coefficients = _signal().minimum_phase(prototype, method="homomorphic")
+        else:
+            raise ValueError(f"The {self.design} design needs band edges, use LowPassFilter, BandpassFilter or PeakFilter")
+        self.filter_state = numpy.zeros(len(self.coefficients) - 1)
+
+    def _designIIR(self, passband, stopband, ripple, attenuation):
+        # The order is the lowest one that meets the band edges, node_count doesn't apply
+        signal = _signal()
+        if self.design == "butterworth":
+            order, natural_frequency = signal.buttord(passband, stopband, ripple, attenuation, fs=self.sample_rate)
+            self.sections = signal.butter(order, natural_frequency, btype="bandpass" if numpy.ndim(passband) else "lowpass", output="sos", fs=self.sample_rate)
+        else:
+            order, natural_frequency = signal.ellipord(passband, stopband, ripple, attenuation, fs=self.sample_rate)
+            self.sections = signal.ellip(order, ripple, attenuation, natural_frequency, btype="bandpass" if numpy.ndim(passband) else "lowpass", output="sos", fs=self.sample_rate)
+        self.filter_state = numpy.zeros((len(self.sections), 2))
+
+    def _isIIR(self):
+        return self.design in ("butterworth", "elliptic")
 
     def work(self, sample_count):
-        unfiltered = self.inputs["unfiltered"].read(sample_count)
-        filtered, self.filter_state = scipy.signal.lfilter(self.coefficients, 1, unfiltered, zi=self.filter_state)
+        unfiltered = self.inputs[self.input_key].read(sample_count)
+        if self.sections is not None:
+            filtered, self.filter_state = _sosfilter(self.sections, unfiltered, self.filter_state)
+        else:
+            filtered, self.filter_state = _lfilter(self.coefficients, unfiltered, self.filter_state)
         self.outputs["filtered"].write(filtered)
 
+    def _response(self, frequencies):
+        if self.sections is not None:
+            return _signal().sosfreqz(self.sections, worN=frequencies, fs=self.sample_rate)[1]
+        return _signal().freqz(self.coefficients, 1, worN=frequencies, fs=self.sample_rate)[1]
+
+    def getGroupDelay(self, frequency=None):
+        # In samples, at the reference frequency of the pass band unless another one is given
+        if frequency == None:
+            frequency = self.reference_frequency
+        if self.design == "linear":
+            return (len(self.coefficients) - 1) / 2
+        step = self.sample_rate * 1e-7
+        response = self._response(numpy.array([frequency - step, frequency + step]))
+        phase_step = numpy.angle(response[1] * numpy.conjugate(response[0]))
+        return float(-phase_step / (2 * numpy.pi * 2 * step) * self.sample_rate)
+
+    def getPhaseDelay(self, frequency=None):
+        # The delay a steady tone sees, which is what matters when aligning a recovered clock
+        if frequency == None:
+            frequency = self.reference_frequency
+        if self.design == "linear" or frequency == 0:
+            return self.getGroupDelay(frequency)
+        phase = numpy.unwrap(numpy.angle(self._response(numpy.linspace(0, frequency, 4097))))
+        return float(-phase[-1] / (2 * numpy.pi * frequency) * self.sample_rate)
+
+
+
+class LowPassFilter(_FilterNode):
+
+    # The IIR designs suit band selection, as in FrequencyDemodulator, but not the symbol filter of a receiver, see getClockDelay
+    def __init__(self, cutoff_frequency, transition_width, node_count, sample_rate, design="linear", ripple=1, attenuation=60):
+        super().__init__("original", design, sample_rate, 0)
+        if self._isIIR():
+            self._designIIR(cutoff_frequency, cutoff_frequency + transition_width, ripple, attenuation)
+        else:
+            frequencies = [0, cutoff_frequency, cutoff_frequency + transition_width, sample_rate / 2]
+            gain = [1, 1, 0, 0]
+            self._designFIR(frequencies, gain, node_count)
 
 
-class BandpassFilter(BaseNode):
 
-    def __init__(self, low_cutoff_frequency, high_cutoff_frequency, transition_width, node_count, sample_rate):
-        super().__init__()
-        self.defineInput("unfiltered")
-        self.defineOutput("filtered")
-        
-        frequencies = [0, low_cutoff_frequency - transition_width, low_cutoff_frequency, high_cutoff_frequency, high_cutoff_frequency + transition_width, sample_rate / 2]
-        gain = [0, 0, 1, 1, 0, 0]
-        self.coefficients = scipy.signal.firwin2(node_count, frequencies, gain, fs=sample_rate)
-        self.filter_state = numpy.zeros(node_count - 1)
+class Filter(_FilterNode):
 
-    def work(self, sample_count):
-        unfiltered = self.inputs["unfiltered"].read(sample_count)
-        filtered, self.filter_state = scipy.signal.lfilter(self.coefficients, 1, unfiltered, zi=self.filter_state)
-        self.outputs["filtered"].write(filtered)
+    def __init__(self, frequencies, gain, node_count, sample_rate, design="linear"):
+        super().__init__("unfiltered", design, sample_rate, frequencies[int(numpy.argmax(gain))])
+        self._designFIR(frequencies, gain, node_count)
 
 
 
-class BandpassFilter(BaseNode):
+class BandpassFilter(_FilterNode):
 
-    def __init__(self, low_cutoff_frequency, high_cutoff_frequency, transition_width, node_count, sample_rate):
-        super().__init__()
-        self.defineInput("unfiltered")
-        self.defineOutput("filtered")
-        
-        frequencies = [0, low_cutoff_frequency - transition_width, low_cutoff_frequency, high_cutoff_frequency, high_cutoff_frequency + transition_width, sample_rate / 2]
-        gain = [0, 0, 1, 1, 0, 0]
-        self.coefficients = scipy.signal.firwin2(node_count, frequencies, gain, fs=sample_rate)
-        self.filter_state = numpy.zeros(node_count - 1)
+    def __init__(self, low_cutoff_frequency, high_cutoff_frequency, transition_width, node_count, sample_rate, design="linear", ripple=1, attenuation=60):
+        super().__init__("unfiltered", design, sample_rate, (low_cutoff_frequency + high_cutoff_frequency) / 2)
+        if self._isIIR():
+            passband = [low_cutoff_frequency, high_cutoff_frequency]
+            stopband = [low_cutoff_frequency - transition_width, high_cutoff_frequency + transition_width]
+            self._designIIR(passband, stopband, ripple, attenuation)
+        else:
+            frequencies = [0, low_cutoff_frequency - transition_width, low_cutoff_frequency, high_cutoff_frequency, high_cutoff_frequency + transition_width, sample_rate / 2]
+            gain = [0, 0, 1, 1, 0, 0]
+            self._designFIR(frequencies, gain, node_count)
 
-    def work(self, sample_count):
-        unfiltered = self.inputs["unfiltered"].read(sample_count)
-        filtered, self.filter_state = scipy.signal.lfilter(self.coefficients, 1, unfiltered, zi=self.filter_state)
-        self.outputs["filtered"].write(filtered)
 
 
+class PeakFilter(_FilterNode):
 
-class PeakFilter(BaseNode):
+    def __init__(self, peak_frequency, transition_width, node_count, sample_rate, design="linear", ripple=1, attenuation=40):
+        super().__init__("unfiltered", design, sample_rate, peak_frequency)
+        if self._isIIR():
+            # The FIR peak falls off linearly to the stop band, a quarter of the width on each side is kept flat
+            passband = [peak_frequency - transition_width / 4, peak_frequency + transition_width / 4]
+            stopband = [peak_frequency - transition_width, peak_frequency + transition_width]
+            self._designIIR(passband, stopband, ripple, attenuation)
+        else:
+            frequencies = [0, peak_frequency - transition_width, peak_frequency, peak_frequency + transition_width, sample_rate / 2]
+            gain = [0, 0, 1, 0, 0]
+            self._designFIR(frequencies, gain, node_count)
 
-    def __init__(self, peak_frequency, transition_width, node_count, sample_rate):
+
+
+class FilterBank(BaseNode):
+
+    state_attributes = ("history",)
+
+    def __init__(self, filters, fft_size=None):
         super().__init__()
         self.defineInput("unfiltered")
-        self.defineOutput("filtered")
-        
-        frequencies = [0, peak_frequency - transition_width, peak_frequency, peak_frequency + transition_width, sample_rate / 2]
-        gain = [0, 0, 1, 0, 0]
-        self.coefficients = scipy.signal.firwin2(node_count, frequencies, gain, fs=sample_rate)
-        self.filter_state = numpy.zeros(node_count - 1)
+        self.defineOutputGroup("filtered", len(filters))
+        if any(node_filter.sections is not None for node_filter in filters):
+            raise ValueError("Only FIR designs can share a spectrum, IIR filters have to run on their own")
+
+        # Shorter filters are zero padded at the end, which leaves their output and delay unchanged
+        self.filters = filters
+        self.tap_count = max(len(node_filter.coefficients) for node_filter in filters)
+        self.coefficients = numpy.zeros((len(filters), self.tap_count))
+        for index, node_filter in enumerate(filters):
+            self.coefficients[index, :len(node_filter.coefficients)] = node_filter.coefficients
+
+        if fft_size == None:
+            fft_size = 1 << (4 * self.tap_count - 1).bit_length()
+        if fft_size < self.tap_count:
+            raise ValueError("The FFT has to be at least as long as the longest filter")
+        self.fft_size = fft_size
+        self.hop_size = fft_size - self.tap_count + 1
+        self.history = numpy.zeros(self.tap_count - 1)
+        self.responses = {}
+
+    def _getResponses(self, complex_input):
+        # The responses are transformed once per kind of input, a real input only needs half the spectrum
+        if complex_input not in self.responses:
+            transform = numpy.fft.fft if complex_input else numpy.fft.rfft
+            self.responses[complex_input] = transform(self.coefficients, self.fft_size, axis=1)
+        return self.responses[complex_input]
 
     def work(self, sample_count):
         unfiltered = self.inputs["unfiltered"].read(sample_count)
-        filtered, self.filter_state = scipy.signal.lfilter(self.coefficients, 1, unfiltered, zi=self.filter_state)
-        self.outputs["filtered"].write(filtered)
+        complex_input = numpy.iscomplexobj(unfiltered) or numpy.iscomplexobj(self.history)
+        if complex_input:
+            self.history = self.history.astype(complex)
+        responses = self._getResponses(complex_input)
+
+        # Overlap-save: every block is transformed once and shared by all the filters
+        blocks = []
+        for start in range(0, len(unfiltered), self.hop_size):
+            extended = numpy.concatenate([self.history, unfiltered[start:start + self.hop_size]])
+            self.history = extended[len(extended) - self.tap_count + 1:]
+            if not extended.any():
+                blocks.append(numpy.zeros((len(self.filters), len(extended) - self.tap_count + 1), dtype=extended.dtype))
+                continue
+            if complex_input:
+                filtered = numpy.fft.ifft(numpy.fft.fft(extended, self.fft_size) * responses, axis=1)
+            else:
+                filtered = numpy.fft.irfft(numpy.fft.rfft(extended, self.fft_size) * responses, self.fft_size, axis=1)
+            blocks.append(filtered[:, self.tap_count - 1:len(extended)])
+
+        filtered = numpy.concatenate(blocks, axis=1) if blocks else numpy.zeros((len(self.filters), 0))
+        for node_output, samples in zip(self.outputs["filtered"], filtered):
+            node_output.write(samples)
+
+    def getGroupDelay(self, index=0):
+        return self.filters[index].getGroupDelay()
 
 
 
 class ClockExtractor(BaseNode):
 
-    def __init__(self, frequency, margin, node_count, sampling_rate):
+    def __init__(self, frequency, margin, node_count, sampling_rate, design="linear"):
         super().__init__()
         self.defineInput("signal")
         self.defineOutput("clock")
 
-        self.filter = PeakFilter(frequency, margin, node_count, sampling_rate)
+        self.filter = PeakFilter(frequency, margin, node_count, sampling_rate, design)
         self.filter.outputs["filtered"].registerConsumer(self)
 
+    def getGroupDelay(self):
+        # The clock is a tone at the symbol rate, so the delay it sees is the phase delay of the filter
+        return self.filter.getPhaseDelay()
+
     def work(self, sample_count):
         signal = self.inputs["signal"].read(sample_count)
         squared = signal ** 2
@@ -316,8 +532,24 @@ class ClockExtractor(BaseNode):
 
 
 
+def getClockDelay(demodulator, low_pass, clock_extractor, baud, sample_rate):
+    # The clock tone comes from squaring the half-baud alternations of the data, so it sees the phase delay of the low-pass
+    # where the symbols themselves see its group delay; the rectified clock rises a quarter period before the symbol middle
+    if low_pass._isIIR():
+        # The dispersion of an IIR low-pass near the half-baud cutoff smears symbols into each other, which leaves
+        # a frame error floor at any SNR; the demodulator and clock extractor filters may still be IIR
+        raise ValueError(f"The {low_pass.design} design can't shape received symbols, use a linear or minimum phase low-pass")
+    period = sample_rate / baud
+    clock_path_delay = demodulator.getGroupDelay() + low_pass.getPhaseDelay(baud / 2) + clock_extractor.getGroupDelay()
+    data_path_delay = demodulator.getGroupDelay() + low_pass.getGroupDelay()
+    return round((period / 4 - (clock_path_delay - data_path_delay)) % period)
+
+
+
 class ClockedSampler(BaseNode):
 
+    state_attributes = ("last_clock",)
+
     def __init__(self, block_size):
         super().__init__()
         self.defineInput("original")
@@ -329,40 +561,87 @@ class ClockedSampler(BaseNode):
         self.last_clock = 1
 
     def work(self, sample_count):
-        sampled_buf = Buffer()
-        while sampled_buf.getSampleCount() < sample_count:
+        sampled_blocks = []
+        sampled_amount = 0
+        while sampled_amount < sample_count:
             original = self.inputs["original"].read(self.block_size)
             clock = self.inputs["clock"].read(self.block_size)
-            posedge = numpy.diff(numpy.insert(clock, 0, self.last_clock)) > 0
+            sampled = kernels.sampleRisingEdges(original, clock, self.last_clock)
             self.last_clock = clock[-1]
-            sampled = numpy.take(original, numpy.nonzero(posedge))[0]
-            sampled_buf.write(sampled)
-        self.outputs["sampled"].write(sampled_buf.read(sampled_buf.getSampleCount()))
+            sampled_blocks.append(sampled)
+            sampled_amount += len(sampled)
+        self.outputs["sampled"].write(numpy.concatenate(sampled_blocks))
 
 
 
-"""
-class QuadratureAmplitudeModulator(BaseNode):
+class CarrierSquelch(BaseNode):
+
+    state_attributes = ("open", "quiet_blocks", "pending_blocks", "pending_decisions")
 
-    def __init__(self, carrier_frequency, sample_rate):
+    def __init__(self, frequencies, block_size, sample_rate, open_threshold=0.3, close_threshold=0.15, minimum_power=1e-6, hang_blocks=2, preroll_blocks=1):
         super().__init__()
-        self.defineInputs(["baseband 1"])
-        self.defineInputs(["baseband 2"])
-        self.defineOutputs(["modulated"])
+        self.defineInput("signal")
+        self.defineOutput("gated")
+        self.defineOutput("carrier")
 
-        self.oscillator = ManualNode(Oscillator(carrier_frequency, sample_rate))
+        self.block_size = block_size
+        self.open_threshold = open_threshold
+        self.close_threshold = close_threshold
+        self.minimum_power = minimum_power
+        self.hang_blocks = hang_blocks
+
+        sample_times = numpy.arange(block_size) / sample_rate
+        self.tone_bank = numpy.exp(-2j * numpy.pi * numpy.outer(frequencies, sample_times))
+
+        self.open = False
+        self.quiet_blocks = 0
+        # Blocks are held back so the gate can open early enough to warm up the downstream filters
+        self.pending_blocks = [numpy.zeros(block_size)] * preroll_blocks
+        self.pending_decisions = [False] * preroll_blocks
+
+    def _decide(self, blocks):
+        energy = numpy.sum(numpy.square(numpy.absolute(blocks)), axis=1)
+        tone_power = numpy.sum(numpy.square(numpy.absolute(blocks @ self.tone_bank.T)), axis=1)
+        fraction = tone_power * 2 / (self.block_size * numpy.maximum(energy, 1e-30))
+        loud = energy / self.block_size > self.minimum_power
+
+        decisions = []
+        for block_fraction, block_loud in zip(fraction, loud):
+            if not self.open and block_loud and block_fraction > self.open_threshold:
+                self.open = True
+                self.quiet_blocks = 0
+            elif self.open and (not block_loud or block_fraction < self.close_threshold):
+                self.quiet_blocks += 1
+                if self.quiet_blocks > self.hang_blocks:
+                    self.open = False
+            elif self.open:
+                self.quiet_blocks = 0
+            decisions.append(self.open)
+        return decisions
 
     def work(self, sample_count):
-        baseband1 = self.inputs["baseband 1"].read(sample_count)
-        baseband2 = self.inputs["baseband 2"].read(sample_count)
-        in_phase = baseband1
-        quadrature = baseband2 * 1j
-        modulated = self.oscillator.read(sample_count) * (in_phase + quadrature)
-        scaled = modulated / numpy.sqrt(2)
-        self.outputs["modulated"].write(scaled)
+        block_count = math.ceil(sample_count / self.block_size)
+        signal = self.inputs["signal"].read(block_count * self.block_size)
+        blocks = signal.reshape(block_count, self.block_size)
 
+        all_blocks = self.pending_blocks + list(blocks)
+        all_decisions = self.pending_decisions + self._decide(blocks)
+        preroll_count = len(self.pending_blocks)
 
+        gated = []
+        carrier = []
+        for index in range(block_count):
+            is_open = any(all_decisions[index:index + preroll_count + 1])
+            gated.append(all_blocks[index] if is_open else numpy.zeros(self.block_size, dtype=signal.dtype))
+            carrier.append(numpy.full(self.block_size, float(is_open)))
+        self.pending_blocks = all_blocks[block_count:]
+        self.pending_decisions = all_decisions[block_count:]
 
+        self.outputs["gated"].write(numpy.concatenate(gated))
+        self.outputs["carrier"].write(numpy.concatenate(carrier))
+
+
+"""
 class Repeat(BaseNode):
 
     def __init__(self, repetition_amount):
@@ -426,11 +705,11 @@ class LowPassFilter(BaseNode):
         
         frequencies = [0, cutoff_frequency, cutoff_frequency + transition_width, sample_rate / 2]
         gain = [1, 1, 0, 0]
-        self.coefficients = scipy.signal.firwin2(node_count, frequencies, gain, fs=sample_rate)
+        self.coefficients = _signal().firwin2(node_count, frequencies, gain, fs=sample_rate)
         self.filter_state = numpy.zeros(node_count - 1)
 
     def work(self, sample_count):
         signal = self.inputs["signal"].read(sample_count)
-        filtered, self.filter_state = scipy.signal.lfilter(self.coefficients, 1, signal, zi=self.filter_state)
+        filtered, self.filter_state = _lfilter(self.coefficients, signal, self.filter_state)
         self.outputs["filtered"].write(filtered)
 """
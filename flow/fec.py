@@ -0,0 +1,235 @@
+from . import kernels
+import numpy
+
+
+
+class ConvolutionalCode:
+
+    def __init__(self, constraint_length=7, polynomials=(0o171, 0o133)):
+        self.constraint_length = constraint_length
+        self.polynomials = polynomials
+        self.state_count = 1 << (constraint_length - 1)
+
+        # Column c of the generator matrix belongs to the bit c places after the oldest one in the register
+        shifts = numpy.arange(constraint_length - 1, -1, -1)
+        self.generator = (numpy.array(polynomials)[None, :] >> shifts[:, None]) & 1
+
+        # A state holds the last constraint_length - 1 input bits with the newest one lowest, so the bit that
+        # leads into a state is its lowest bit and its two possible predecessors differ only in the highest one
+        states = numpy.arange(self.state_count)
+        self.predecessors = numpy.stack([states >> 1, (states >> 1) | (self.state_count >> 1)], axis=1)
+        registers = (self.predecessors << 1) | (states[:, None] & 1)
+        outputs = numpy.stack([self._parity(registers & polynomial) for polynomial in polynomials], axis=-1)
+        self.branch_signs = 2.0 * outputs - 1
+
+    def _parity(self, values):
+        parity = numpy.zeros_like(values)
+        while numpy.any(values):
+            parity ^= values & 1
+            values = values >> 1
+        return parity
+
+    def encode(self, bits, terminate=True):
+        bits = numpy.asarray(bits, dtype=numpy.uint8)
+        tail = numpy.zeros(self.constraint_length - 1 if terminate else 0, dtype=numpy.uint8)
+        padded = numpy.concatenate([numpy.zeros(self.constraint_length - 1, dtype=numpy.uint8), bits, tail])
+        windows = numpy.lib.stride_tricks.sliding_window_view(padded, self.constraint_length)
+        return ((windows @ self.generator) % 2).astype(numpy.uint8).reshape(-1)
+
+    def decode(self, soft, terminated=True):
+        # Soft values are positive for ones and negative for zeros, their magnitude is the confidence
+        output_count = len(self.polynomials)
+        soft = numpy.asarray(soft, dtype=float)
+        soft = soft[:len(soft) // output_count * output_count].reshape(-1, output_count)
+        branch_metrics = (soft @ self.branch_signs.reshape(-1, output_count).T).reshape(len(soft), self.state_count, 2)
+        bits = kernels.viterbiDecode(branch_metrics, self.predecessors, 0 if terminated else -1)
+        if terminated:
+            bits = bits[:len(bits) - (self.constraint_length - 1)]
+        return bits
+
+
+
+class _GaloisField:
+
+    def __init__(self, primitive=0x11D):
+        self.exp = numpy.zeros(512, dtype=numpy.int64)
+        self.log = numpy.zeros(256, dtype=numpy.int64)
+        value = 1
+        for power in range(255):
+            self.exp[power] = value
+            self.log[value] = power
+            value <<= 1
+            if value & 0x100:
+                value ^= primitive
+        self.exp[255:510] = self.exp[:255]
+
+        elements = numpy.arange(256)
+        products = self.exp[self.log[elements][:, None] + self.log[elements][None, :]]
+        products[0, :] = 0
+        products[:, 0] = 0
+        self.multiply = products.astype(numpy.uint8)
+
+    def inverse(self, value):
+        return int(self.exp[255 - self.log[value]])
+
+    def evaluate(self, coefficients, point):
+        # Polynomials are lists of coefficients with the constant term first
+        result = 0
+        for coefficient in reversed(coefficients):
+            result = int(self.multiply[result, point]) ^ coefficient
+        return result
+
+
+
+_field = None
+
+
+def _galoisField():
+    global _field
+    if _field == None:
+        _field = _GaloisField()
+    return _field
+
+
+
+class ReedSolomonCode:
+
+    def __init__(self, message_length=223, parity_length=32):
+        if message_length + parity_length > 255:
+            raise ValueError("A Reed-Solomon codeword over GF(256) holds at most 255 bytes")
+
+        self.message_length = message_length
+        self.parity_length = parity_length
+        self.codeword_length = message_length + parity_length
+        self.field = _galoisField()
+
+        # Generator roots are alpha^1 ... alpha^parity_length, coefficients are kept highest degree first
+        generator = numpy.ones(1, dtype=numpy.uint8)
+        for power in range(1, parity_length + 1):
+            root = self.field.exp[power]
+            shifted = numpy.concatenate([generator, [0]]).astype(numpy.uint8)
+            scaled = numpy.concatenate([[0], self.field.multiply[generator, root]]).astype(numpy.uint8)
+            generator = shifted ^ scaled
+        self.generator = generator
+        self.roots = self.field.exp[1:parity_length + 1].astype(numpy.uint8)
+
+    def encode(self, messages):
+        # Accepts one message or a batch of them as rows, the parity register runs over the whole batch at once
+        messages = numpy.asarray(messages, dtype=numpy.uint8)
+        batch = numpy.atleast_2d(messages)
+        parity = numpy.zeros((len(batch), self.parity_length), dtype=numpy.uint8)
+        for column in range(self.message_length):
+            feedback = batch[:, column] ^ parity[:, 0]
+            parity[:, :-1] = parity[:, 1:]
+            parity[:, -1] = 0
+            parity ^= self.field.multiply[feedback[:, None], self.generator[None, 1:]]
+        codewords = numpy.concatenate([batch, parity], axis=1)
+        return codewords if messages.ndim == 2 else codewords[0]
+
+    def _syndromes(self, codewords):
+        syndromes = numpy.zeros((len(codewords), self.parity_length), dtype=numpy.uint8)
+        for column in range(self.codeword_length):
+            syndromes = self.field.multiply[syndromes, self.roots[None, :]] ^ codewords[:, column, None]
+        return syndromes
+
+    def _errorLocator(self, syndromes):
+        # Berlekamp-Massey
+        field = self.field
+        locator = [1]
+        previous = [1]
+        length = 0
+        shift = 1
+        previous_discrepancy = 1
+        for index in range(self.parity_length):
+            discrepancy = syndromes[index]
+            for degree in range(1, length + 1):
+                discrepancy ^= int(field.multiply[locator[degree], syndromes[index - degree]])
+            if discrepancy == 0:
+                shift += 1
+                continue
+            scale = int(field.multiply[discrepancy, field.inverse(previous_discrepancy)])
+            updated = locator + [0] * max(0, len(previous) + shift - len(locator))
+            for degree, coefficient in enumerate(previous):
+                updated[degree + shift] ^= int(field.multiply[scale, coefficient])
+            if 2 * length <= index:
+                previous = locator
+                length = index + 1 - length
+                previous_discrepancy = discrepancy
+                shift = 1
+            else:
+                shift += 1
+            locator = updated
+        return locator[:length + 1], length
+
+    def _correct(self, codeword, syndromes):
+        field = self.field
+        locator, error_count = self._errorLocator([int(value) for value in syndromes])
+        if error_count * 2 > self.parity_length:
+            return None
+
+        # Chien search: the locator vanishes at alpha^-d for every error at degree d
+        degrees = numpy.arange(self.codeword_length)
+        terms = [numpy.full(self.codeword_length, coefficient) if coefficient == 0 else field.exp[(field.log[coefficient] - power * degrees) % 255] for power, coefficient in enumerate(locator)]
+        error_degrees = numpy.flatnonzero(numpy.bitwise_xor.reduce(terms, axis=0) == 0)
+        if len(error_degrees) != error_count:
+            return None
+
+        # Forney: with the first root at alpha^1 the magnitude is evaluator / locator' at the inverse error location
+        evaluator = [0] * self.parity_length
+        for degree, coefficient in enumerate(locator):
+            for index in range(self.parity_length - degree):
+                evaluator[degree + index] ^= int(field.multiply[coefficient, syndromes[index]])
+        derivative = [coefficient if degree % 2 == 1 else 0 for degree, coefficient in enumerate(locator)][1:]
+
+        corrected = codeword.copy()
+        for degree in error_degrees:
+            inverse_location = int(field.exp[(255 - degree) % 255])
+            denominator = field.evaluate(derivative, inverse_location)
+            if denominator == 0:
+                return None
+            magnitude = int(field.multiply[field.evaluate(evaluator, inverse_location), field.inverse(denominator)])
+            corrected[self.codeword_length - 1 - degree] ^= magnitude
+        return corrected
+
+    def decode(self, codewords):
+        # Returns the messages and the number of corrected bytes per codeword, -1 where correction failed
+        codewords = numpy.asarray(codewords, dtype=numpy.uint8)
+        batch = numpy.atleast_2d(codewords).copy()
+        syndromes = self._syndromes(batch)
+        error_counts = numpy.zeros(len(batch), dtype=int)
+
+        # Clean codewords are the common case and need nothing beyond the batched syndromes
+        for index in numpy.flatnonzero(numpy.any(syndromes, axis=1)):
+            corrected = self._correct(batch[index], syndromes[index])
+            if corrected is None:
+                error_counts[index] = -1
+                continue
+            error_counts[index] = int(numpy.count_nonzero(corrected != batch[index]))
+            batch[index] = corrected
+
+        messages = batch[:, :self.message_length]
+        if codewords.ndim == 2:
+            return messages, error_counts
+        return messages[0], error_counts[0]
+
+
+
+class BlockInterleaver:
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.block_size = rows * columns
+
+    def _blocks(self, values, rows, columns):
+        values = numpy.asarray(values)
+        if len(values) % self.block_size != 0:
+            raise ValueError(f"The length has to be a multiple of the block size {self.block_size}")
+        return values.reshape(-1, rows, columns)
+
+    def interleave(self, values):
+        # Written row by row and read column by column, so a burst is spread over many rows
+        return self._blocks(values, self.rows, self.columns).transpose(0, 2, 1).reshape(-1)
+
+    def deinterleave(self, values):
+        return self._blocks(values, self.columns, self.rows).transpose(0, 2, 1).reshape(-1)
@@ -0,0 +1,306 @@
+from .nodes import BaseNode, ElementwiseNode, Buffer
+import threading
+import numpy
+import json
+import math
+
+
+
+class FusedNode(BaseNode):
+
+    def __init__(self, stages):
+        super().__init__()
+
+        # Each stage is a node together with the key of the input fed by the previous stage
+        self.stages = stages
+        for index, (node, chained_key) in enumerate(stages):
+            for key in node.input_keys:
+                if key != chained_key:
+                    self.inputs[f"{index}/{key}"] = node.inputs[key]
+
+        last_node = stages[-1][0]
+        self.outputs = last_node.outputs
+        for node_output in self.outputs.values():
+            node_output.parent_node = self
+
+    def work(self, sample_count):
+        input_amount = sample_count
+        for node, _ in reversed(self.stages):
+            input_amount = math.ceil(input_amount / node.rate)
+
+        samples = None
+        for node, chained_key in self.stages:
+            if samples is not None:
+                input_amount = len(samples)
+            operands = []
+            for key in node.input_keys:
+                if key == chained_key:
+                    operands.append(samples)
+                else:
+                    operands.append(node.inputs[key].read(input_amount))
+            samples = node.kernel(*operands)
+
+        last_node = self.stages[-1][0]
+        self.outputs[last_node.output_key].write(samples)
+
+
+
+def _childNodes(value, name):
+    # Composite nodes keep their inner nodes as attributes, possibly inside lists or tuples like FusedNode.stages
+    if isinstance(value, BaseNode):
+        yield name, value
+    elif isinstance(value, (list, tuple)):
+        for index, member in enumerate(value):
+            yield from _childNodes(member, f"{name}[{index}]")
+
+
+
+def _ports(ports):
+    for key, port in ports.items():
+        if isinstance(port, list):
+            for index, member in enumerate(port):
+                yield f"{key}[{index}]", member
+        else:
+            yield key, port
+
+
+
+def _nodeBuffers(node):
+    for key, node_input in _ports(node.inputs):
+        yield f"inputs.{key}", node_input.buffer
+    for key, node_output in _ports(node.outputs):
+        for index, buffer in enumerate(node_output.buffers.values()):
+            yield f"outputs.{key}.{index}", buffer
+
+
+
+def _nodePorts(node):
+    for key, node_input in _ports(node.inputs):
+        yield f"inputs.{key}", node_input
+    for key, node_output in _ports(node.outputs):
+        yield f"outputs.{key}", node_output
+
+
+
+def _walkState(node, prefix, visited):
+    # Yields (key, owner, attribute) for every piece of state, in the same order for identically built graphs
+    if id(node) in visited:
+        return
+    visited.add(id(node))
+    for attribute in node.state_attributes:
+        yield prefix + attribute, node, attribute
+    for key, port in _nodePorts(node):
+        if id(port) not in visited:
+            visited.add(id(port))
+            yield f"{prefix}{key}.position", port, "position"
+    for key, buffer in _nodeBuffers(node):
+        if id(buffer) not in visited:
+            visited.add(id(buffer))
+            for attribute in buffer.state_attributes:
+                yield f"{prefix}{key}.{attribute}", buffer, attribute
+    for attribute, value in sorted(vars(node).items()):
+        for name, child in _childNodes(value, attribute):
+            yield from _walkState(child, f"{prefix}{name}.", visited)
+
+
+
+class Graph:
+
+    def __init__(self, nodes=()):
+        self.nodes = []
+        self.stopped = threading.Event()
+        for node in nodes:
+            self.addNode(node)
+
+    def addNode(self, node):
+        self.nodes.append(node)
+        return node
+
+    def start(self):
+        self.stopped.clear()
+        for _, _, _, buffer in self._edges():
+            buffer.release(False)
+        for node in self.nodes:
+            node.start()
+
+    def stop(self):
+        self.stopped.set()
+        for _, _, _, buffer in self._edges():
+            buffer.release()
+        for node in reversed(self.nodes):
+            node.stop()
+
+    def join(self, timeout=None):
+        for node in self.nodes:
+            node.join(timeout)
+
+    def wait(self, memory_limit=None):
+        # Waiting in short slices keeps the main thread responsive to KeyboardInterrupt
+        try:
+            while not self.stopped.wait(0.5):
+                if memory_limit != None and self.getMemoryUsage() > memory_limit:
+                    self.stop()
+                    self.join()
+                    unread = ", ".join(f"{edge['producer']} -> {edge['consumer']}" for edge in self.findUnreadConsumers())
+                    raise MemoryError(f"Edge buffers exceed {memory_limit} bytes, lagging consumers: {unread or 'none'}")
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+        self.join()
+
+    def _edges(self):
+        for node in self.nodes:
+            for key, node_outputs in node.outputs.items():
+                group = node_outputs if isinstance(node_outputs, list) else [node_outputs]
+                for index, node_output in enumerate(group):
+                    name = f"{key}[{index}]" if isinstance(node_outputs, list) else key
+                    for consumer, buffer in node_output.buffers.items():
+                        yield node, name, consumer, buffer
+
+    def _consumerNames(self):
+        names = {}
+        for node in self.nodes:
+            for key, node_inputs in node.inputs.items():
+                group = node_inputs if isinstance(node_inputs, list) else [node_inputs]
+                for index, node_input in enumerate(group):
+                    names[node_input] = f"{type(node).__name__}.{key}[{index}]" if isinstance(node_inputs, list) else f"{type(node).__name__}.{key}"
+        return names
+
+    def getEdgeStats(self):
+        names = self._consumerNames()
+        edges = []
+        for node, key, consumer, buffer in self._edges():
+            if consumer in names:
+                consumer_name = names[consumer]
+            else:
+                # Composite nodes register themselves, anything else is read from outside the graph
+                consumer_name = type(consumer).__name__ if isinstance(consumer, BaseNode) else "external"
+            edges.append({
+                "producer": f"{type(node).__name__}.{key}",
+                "consumer": consumer_name,
+                "samples": buffer.getSampleCount(),
+                "bytes": buffer.getByteCount(),
+                "capacity": buffer.capacity,
+                "policy": buffer.policy,
+                "written": buffer.samples_written,
+                "read": buffer.samples_read,
+                "dropped": buffer.samples_dropped,
+                })
+        return edges
+
+    def getMemoryUsage(self):
+        return sum(buffer.getByteCount() for _, _, _, buffer in self._edges())
+
+    def findUnreadConsumers(self, threshold=2 ** 20):
+        # Consumers that are fed but have never read come first, then those whose backlog exceeds the buffer capacity
+        # or the threshold, most backlogged first; samples a drop policy discarded aren't waiting to be read
+        unread = []
+        lagging = []
+        for edge in self.getEdgeStats():
+            backlog = edge["written"] - edge["read"] - edge["dropped"]
+            limit = edge["capacity"] if edge["capacity"] != None else threshold
+            if edge["written"] > 0 and edge["read"] == 0:
+                unread.append(edge)
+            elif backlog > limit:
+                lagging.append(edge)
+        lagging.sort(key=lambda edge: edge["written"] - edge["read"] - edge["dropped"], reverse=True)
+        return unread + lagging
+
+    def _walkState(self):
+        visited = set()
+        for index, node in enumerate(self.nodes):
+            yield from _walkState(node, f"{index}:{type(node).__name__}.", visited)
+
+    def snapshot(self, path=None):
+        # Take it on a stopped graph, or between pulls from the one thread that drives it
+        state = {}
+        missing = []
+        for key, owner, attribute in self._walkState():
+            value = getattr(owner, attribute)
+            if isinstance(value, Buffer):
+                value = value.array
+            elif isinstance(value, numpy.random.Generator):
+                # Bit generator states hold integers wider than any numpy type
+                value = json.dumps(value.bit_generator.state)
+            if value is None:
+                missing.append(key)
+                continue
+            state[key] = numpy.asarray(value)
+        state["none"] = numpy.array(missing, dtype=str)
+        if path != None:
+            numpy.savez(path, **state)
+        return state
+
+    def restore(self, snapshot):
+        # snapshot is a path written by snapshot() or the dictionary it returned, for a graph built the same way
+        state = numpy.load(snapshot) if isinstance(snapshot, (str, bytes)) or hasattr(snapshot, "__fspath__") else snapshot
+        missing = set(state["none"].tolist())
+        for key, owner, attribute in self._walkState():
+            if key in missing:
+                setattr(owner, attribute, None)
+                continue
+            if key not in state:
+                raise KeyError(f"The snapshot has no {key}, it was taken from a different graph")
+            value = state[key]
+            current = getattr(owner, attribute)
+            if isinstance(current, Buffer):
+                with current.condition:
+                    current.array = value.copy()
+                continue
+            if isinstance(current, numpy.random.Generator):
+                current.bit_generator.state = json.loads(value.item())
+                continue
+            if isinstance(current, list):
+                value = value.tolist() if value.ndim < 2 else list(value.copy())
+            elif not isinstance(current, numpy.ndarray) and value.ndim == 0:
+                value = value.item()
+            else:
+                value = value.copy()
+            setattr(owner, attribute, value)
+
+    def _fusablePredecessor(self, node):
+        for key in node.input_keys:
+            node_input = node.inputs[key]
+            producer = node_input.producer
+            if producer == None or not isinstance(producer.parent_node, ElementwiseNode) or not producer.parent_node.fusable:
+                continue
+            if producer.parent_node not in self.nodes:
+                continue
+            # The intermediate edge must feed nothing else and must not hold samples that are already in flight
+            if list(producer.buffers) != [node_input]:
+                continue
+            if node_input.buffer.getSampleCount() > 0 or producer.buffers[node_input].getSampleCount() > 0:
+                continue
+            return producer.parent_node, key
+        return None
+
+    def fuseElementwise(self):
+        predecessors = {}
+        for node in self.nodes:
+            if isinstance(node, ElementwiseNode) and node.fusable:
+                predecessor = self._fusablePredecessor(node)
+                if predecessor != None:
+                    predecessors[node] = predecessor
+        successors = {predecessor: node for node, (predecessor, _) in predecessors.items()}
+
+        fused_nodes = []
+        for node in list(self.nodes):
+            if node not in predecessors or node in successors:
+                continue
+            stages = [(node, predecessors[node][1])]
+            while stages[0][0] in predecessors:
+                predecessor, _ = predecessors[stages[0][0]]
+                chained_key = predecessors[predecessor][1] if predecessor in predecessors else None
+                stages.insert(0, (predecessor, chained_key))
+
+            for (predecessor, _), (successor, chained_key) in zip(stages, stages[1:]):
+                node_input = successor.inputs[chained_key]
+                del predecessor.outputs[predecessor.output_key].buffers[node_input]
+                node_input.producer = None
+
+            fused = FusedNode(stages)
+            fused_nodes.append(fused)
+            for stage_node, _ in stages:
+                self.nodes.remove(stage_node)
+            self.nodes.append(fused)
+        return fused_nodes
@@ -1,5 +1,4 @@
 import numpy
-import pyaudio
 from .nodes import BaseNode
 from .basic import Interleaver, Deinterleaver
 import threading
@@ -32,22 +31,34 @@ class AudioIO(BaseNode):
         elif sample_width == 4:
             self.data_type = numpy.int32
         
+        self.sample_width = sample_width
         self.block_size = block_size
         self.new_data_condition = threading.Condition()
+        self.pyaudio = None
+        self.stream = None
+        self.loopback_delay = 0
+
+    def _openStream(self):
+        # PyAudio enumerates every host API and device when instantiated, so that is deferred until the stream is needed
+        import pyaudio
+
+        self.continue_flag = pyaudio.paContinue
         self.pyaudio = pyaudio.PyAudio()
         self.stream = self.pyaudio.open(
-            format=self.pyaudio.get_format_from_width(sample_width, True),
-            channels=channel_count,
-            rate=sample_rate,
+            format=self.pyaudio.get_format_from_width(self.sample_width, True),
+            channels=self.channel_count,
+            rate=self.sample_rate,
             input=True,
             output=True,
             start=False,
-            frames_per_buffer=block_size,
+            frames_per_buffer=self.block_size,
             stream_callback=self._IOCallback
             )
         
     def _IOCallback(self, bytes_in, frame_count, time_info, status):
         type_info = numpy.iinfo(self.data_type)
+        # Input and output advance in lockstep, so a sample played now is captured this many samples later
+        self.loopback_delay = (time_info["output_buffer_dac_time"] - time_info["input_buffer_adc_time"]) * self.sample_rate
     
         real_in = numpy.frombuffer(bytes_in, dtype=self.data_type)
         normalized_in = numpy.interp(real_in, [type_info.min, type_info.max], [-1, 1])
@@ -66,12 +77,37 @@ class AudioIO(BaseNode):
         real_out = numpy.interp(normalized_out.real, [-1, 1], [type_info.min, type_info.max])
         bytes_out = real_out.round().astype(self.data_type).tobytes()
 
-        return (bytes_out, pyaudio.paContinue)
+        return (bytes_out, self.continue_flag)
 
     def start(self):
+        super().start()
+        if self.stream == None:
+            self._openStream()
         self.stream.start_stream()
 
+    def stop(self):
+        with self.new_data_condition:
+            super().stop()
+            self.new_data_condition.notify_all()
+        if self.stream != None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.pyaudio != None:
+            self.pyaudio.terminate()
+            self.pyaudio = None
+
+    def getGroupDelay(self):
+        # Device latency between audio_out and audio_in when they are looped back
+        return self.loopback_delay
+
     def work(self, sample_count):
         for _ in range(math.ceil(sample_count / self.block_size)):
             with self.new_data_condition:
-                self.new_data_condition.wait()
\ No newline at end of file
+                if self.stopped.is_set():
+                    break
+                self.new_data_condition.wait()
+        if self.stopped.is_set():
+            # Let readers that are still blocked in the graph finish with silence
+            for node_output in self.outputs["audio_in"]:
+                node_output.write(numpy.zeros(sample_count))
\ No newline at end of file
@@ -0,0 +1,213 @@
+import numpy
+import cmath
+import math
+import os
+
+
+
+def _numpyIntegratePhase(frequency, time_deltas, last_phase):
+    phase = numpy.cumsum(time_deltas * 2 * numpy.pi * frequency) + last_phase
+    return phase
+
+
+def _numpySampleRisingEdges(original, clock, last_clock):
+    posedge = numpy.diff(clock, prepend=last_clock) > 0
+    return original[posedge]
+
+
+def _numpyManchesterDecode(bits):
+    pairs = bits[:len(bits) // 2 * 2].reshape(-1, 2)
+    valid = pairs[:, 0] != pairs[:, 1]
+    return pairs[valid, 0]
+
+
+def _numpyTrackCarrier(symbols, points, phase, frequency, alpha, beta):
+    # Each correction depends on the previous decision, so this loop can't be vectorized; plain Python
+    # complex numbers are much cheaper than numpy scalars here
+    points = points.tolist()
+    corrected = []
+    for symbol in symbols.tolist():
+        rotated = symbol * cmath.exp(-1j * phase)
+        decision = min(points, key=lambda point: abs(point - rotated))
+        error = cmath.phase(rotated * decision.conjugate())
+        frequency += beta * error
+        phase += frequency + alpha * error
+        corrected.append(rotated)
+    return numpy.array(corrected, dtype=complex), phase % (2 * math.pi), frequency
+
+
+def _numpyViterbiDecode(branch_metrics, predecessors, final_state):
+    # Add-compare-select runs over all states at once, only the time axis is sequential
+    step_count, state_count, _ = branch_metrics.shape
+    metrics = numpy.full(state_count, -numpy.inf)
+    metrics[0] = 0
+    decisions = numpy.empty((step_count, state_count), dtype=numpy.uint8)
+    first_predecessors = predecessors[:, 0]
+    second_predecessors = predecessors[:, 1]
+    for step in range(step_count):
+        first = metrics[first_predecessors] + branch_metrics[step, :, 0]
+        second = metrics[second_predecessors] + branch_metrics[step, :, 1]
+        numpy.greater(second, first, out=decisions[step])
+        metrics = numpy.maximum(first, second)
+        metrics -= metrics.max()
+
+    state = final_state if final_state >= 0 else int(numpy.argmax(metrics))
+    bits = numpy.empty(step_count, dtype=numpy.uint8)
+    for step in range(step_count - 1, -1, -1):
+        bits[step] = state & 1
+        state = predecessors[state, decisions[step, state]]
+    return bits
+
+
+
+def _compileNumba():
+    import numba
+
+    @numba.njit(cache=True)
+    def integratePhase(frequency, time_deltas, last_phase):
+        phase = numpy.empty(len(frequency))
+        accumulated = last_phase
+        for index in range(len(frequency)):
+            accumulated += time_deltas[index] * 2 * numpy.pi * frequency[index]
+            phase[index] = accumulated
+        return phase
+
+    @numba.njit(cache=True)
+    def sampleRisingEdges(original, clock, last_clock):
+        sampled = numpy.empty(len(original), dtype=original.dtype)
+        count = 0
+        previous = last_clock
+        for index in range(len(clock)):
+            if clock[index] > previous:
+                sampled[count] = original[index]
+                count += 1
+            previous = clock[index]
+        return sampled[:count]
+
+    @numba.njit(cache=True)
+    def manchesterDecode(bits):
+        decoded = numpy.empty(len(bits) // 2, dtype=bits.dtype)
+        count = 0
+        for index in range(len(bits) // 2):
+            if bits[2 * index] != bits[2 * index + 1]:
+                decoded[count] = bits[2 * index]
+                count += 1
+        return decoded[:count]
+
+    @numba.njit(cache=True)
+    def trackCarrier(symbols, points, phase, frequency, alpha, beta):
+        corrected = numpy.empty_like(symbols)
+        for index in range(len(symbols)):
+            rotated = symbols[index] * numpy.exp(-1j * phase)
+            decision = points[numpy.argmin(numpy.abs(points - rotated))]
+            error = numpy.angle(rotated * numpy.conj(decision))
+            frequency += beta * error
+            phase += frequency + alpha * error
+            corrected[index] = rotated
+        return corrected, phase % (2 * numpy.pi), frequency
+
+    @numba.njit(cache=True)
+    def viterbiDecode(branch_metrics, predecessors, final_state):
+        step_count, state_count, _ = branch_metrics.shape
+        metrics = numpy.full(state_count, -numpy.inf)
+        metrics[0] = 0
+        updated = numpy.empty(state_count)
+        decisions = numpy.empty((step_count, state_count), dtype=numpy.uint8)
+        for step in range(step_count):
+            best = -numpy.inf
+            for state in range(state_count):
+                first = metrics[predecessors[state, 0]] + branch_metrics[step, state, 0]
+                second = metrics[predecessors[state, 1]] + branch_metrics[step, state, 1]
+                if second > first:
+                    updated[state] = second
+                    decisions[step, state] = 1
+                else:
+                    updated[state] = first
+                    decisions[step, state] = 0
+                best = max(best, updated[state])
+            for state in range(state_count):
+                metrics[state] = updated[state] - best
+
+        state = final_state if final_state >= 0 else numpy.argmax(metrics)
+        bits = numpy.empty(step_count, dtype=numpy.uint8)
+        for step in range(step_count - 1, -1, -1):
+            bits[step] = state & 1
+            state = predecessors[state, decisions[step, state]]
+        return bits
+
+    return {
+        "integratePhase": integratePhase,
+        "sampleRisingEdges": sampleRisingEdges,
+        "manchesterDecode": manchesterDecode,
+        "trackCarrier": trackCarrier,
+        "viterbiDecode": viterbiDecode,
+        }
+
+
+
+_BACKENDS = {
+    "numpy": lambda: {
+        "integratePhase": _numpyIntegratePhase,
+        "sampleRisingEdges": _numpySampleRisingEdges,
+        "manchesterDecode": _numpyManchesterDecode,
+        "trackCarrier": _numpyTrackCarrier,
+        "viterbiDecode": _numpyViterbiDecode,
+        },
+    "numba": _compileNumba,
+    }
+
+_active_name = None
+_active = None
+
+
+
+def setBackend(name):
+    global _active_name, _active
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown kernel backend {name!r}")
+    _active = _BACKENDS[name]()
+    _active_name = name
+
+
+def getBackend():
+    if _active == None:
+        _selectDefaultBackend()
+    return _active_name
+
+
+def _selectDefaultBackend():
+    requested = os.environ.get("FLOW_KERNELS")
+    if requested != None:
+        setBackend(requested)
+        return
+    try:
+        setBackend("numba")
+    except ImportError:
+        setBackend("numpy")
+
+
+def _kernel(name):
+    if _active == None:
+        _selectDefaultBackend()
+    return _active[name]
+
+
+
+def integratePhase(frequency, time_deltas, last_phase):
+    return _kernel("integratePhase")(frequency, time_deltas, last_phase)
+
+
+def sampleRisingEdges(original, clock, last_clock):
+    return _kernel("sampleRisingEdges")(original, clock, last_clock)
+
+
+def manchesterDecode(bits):
+    return _kernel("manchesterDecode")(bits)
+
+
+def trackCarrier(symbols, points, phase, frequency, alpha, beta):
+    return _kernel("trackCarrier")(symbols, points, phase, frequency, alpha, beta)
+
+
+def viterbiDecode(branch_metrics, predecessors, final_state):
+    return _kernel("viterbiDecode")(branch_metrics, predecessors, final_state)
@@ -0,0 +1,107 @@
+from .nodes import BaseNode
+from .basic import NearestNeighbourResampler
+from .dsp import SineFrequencyModulator
+import numpy
+import math
+
+
+
+def grayEncode(values):
+    return values ^ (values >> 1)
+
+
+def grayDecode(codes):
+    values = codes.copy()
+    shift = codes >> 1
+    while numpy.any(shift):
+        values ^= shift
+        shift >>= 1
+    return values
+
+
+
+class GrayMapper(BaseNode):
+
+    def __init__(self, bits_per_symbol):
+        super().__init__()
+        self.defineInput("bits")
+        self.defineOutput("symbols")
+
+        self.bits_per_symbol = bits_per_symbol
+        self.weights = 1 << numpy.arange(bits_per_symbol - 1, -1, -1)
+
+    def work(self, sample_count):
+        bits = self.inputs["bits"].read(sample_count * self.bits_per_symbol) > 0
+        codes = bits.reshape(sample_count, self.bits_per_symbol) @ self.weights
+        # Neighbouring tones then differ in a single bit, so the likeliest detection error costs one bit
+        tones = grayDecode(codes)
+        levels = 2 * tones / ((1 << self.bits_per_symbol) - 1) - 1
+        self.outputs["symbols"].write(levels)
+
+
+
+class MFSKModulator(BaseNode):
+
+    def __init__(self, bits_per_symbol, center_frequency, tone_spacing, baud, sample_rate):
+        super().__init__()
+
+        tone_count = 1 << bits_per_symbol
+        deviation = tone_spacing * (tone_count - 1) / 2
+
+        self.mapper = GrayMapper(bits_per_symbol)
+        self.resampler = NearestNeighbourResampler(sample_rate / baud)
+        self.resampler.inputs["original"].assignProducer(self.mapper.outputs["symbols"])
+        self.modulator = SineFrequencyModulator(center_frequency, deviation, sample_rate, True)
+        self.modulator.inputs["baseband"].assignProducer(self.resampler.outputs["resampled"])
+
+        # The chain changes rate, so the ports of its ends are exposed directly instead of copying through work()
+        self.inputs["bits"] = self.mapper.inputs["bits"]
+        self.outputs["modulated"] = self.modulator.outputs["modulated"]
+
+
+
+class MFSKDemodulator(BaseNode):
+
+    state_attributes = ("symbol_index", "buffer_start", "buffer")
+
+    def __init__(self, bits_per_symbol, center_frequency, tone_spacing, baud, sample_rate, offset=0):
+        super().__init__()
+        self.defineInput("modulated")
+        self.defineOutput("bits")
+
+        self.bits_per_symbol = bits_per_symbol
+        self.samples_per_symbol = sample_rate / baud
+        self.window_size = int(self.samples_per_symbol)
+        self.offset = offset
+
+        tone_count = 1 << bits_per_symbol
+        frequencies = center_frequency + tone_spacing * (numpy.arange(tone_count) - (tone_count - 1) / 2)
+        sample_times = numpy.arange(self.window_size) / sample_rate
+        self.tone_bank = numpy.exp(-2j * numpy.pi * numpy.outer(sample_times, frequencies))
+        self.bit_shifts = numpy.arange(bits_per_symbol - 1, -1, -1)
+
+        # A negative offset places the first symbol before the stream starts, that part is padded with silence
+        self.symbol_index = 0
+        self.buffer_start = min(0, offset)
+        self.buffer = numpy.zeros(-self.buffer_start)
+
+    def _symbolStart(self, symbol_indices):
+        return numpy.round(symbol_indices * self.samples_per_symbol).astype(numpy.int64) + self.offset
+
+    def work(self, sample_count):
+        symbol_count = math.ceil(sample_count / self.bits_per_symbol)
+        starts = self._symbolStart(self.symbol_index + numpy.arange(symbol_count))
+        needed = starts[-1] + self.window_size - self.buffer_start - len(self.buffer)
+        if needed > 0:
+            self.buffer = numpy.concatenate([self.buffer, self.inputs["modulated"].read(needed).real])
+
+        windows = self.buffer[starts[:, None] - self.buffer_start + numpy.arange(self.window_size)]
+        energy = numpy.square(numpy.absolute(windows @ self.tone_bank))
+        codes = grayEncode(numpy.argmax(energy, axis=1))
+        bits = (codes[:, None] >> self.bit_shifts) & 1
+
+        self.symbol_index += symbol_count
+        next_start = self._symbolStart(self.symbol_index)
+        self.buffer = self.buffer[next_start - self.buffer_start:]
+        self.buffer_start = next_start
+        self.outputs["bits"].write(bits.reshape(-1).astype(float))
@@ -1,23 +1,79 @@
 import numpy
 import threading
+import math
+import time
 
 
 
 class Buffer:
 
-    def __init__(self):
+    POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    # Saved by Graph.snapshot along with the state of the nodes
+    state_attributes = ("array", "samples_written", "samples_read", "samples_dropped")
+
+    def __init__(self, capacity=None, policy="block"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown buffer policy {policy!r}")
+
         self.array = numpy.array([])
+        self.capacity = capacity
+        self.policy = policy
+        self.condition = threading.Condition()
+        self.released = False
+        self.pulling_thread = None
+
+        self.samples_written = 0
+        self.samples_read = 0
+        self.samples_dropped = 0
 
     def getSampleCount(self):
         return len(self.array)
+
+    def getByteCount(self):
+        return self.array.nbytes
     
     def read(self, sample_count):
-        output_samples = self.array[:sample_count]
-        self.array = self.array[sample_count:]
+        with self.condition:
+            output_samples = self.array[:sample_count]
+            self.array = self.array[sample_count:]
+            self.samples_read += len(output_samples)
+            self.condition.notify_all()
         return output_samples
 
     def write(self, samples):
-        self.array = numpy.concatenate([self.array, samples])
+        with self.condition:
+            self.samples_written += len(samples)
+            if self.capacity != None:
+                samples = self._makeRoom(samples)
+            self.array = numpy.concatenate([self.array, samples])
+
+    def _makeRoom(self, samples):
+        if self.policy == "block":
+            # Waits until the consumer has taken something out, the block may then overshoot the capacity once;
+            # a consumer pulling the data itself is never held up by its own buffer
+            while len(self.array) >= self.capacity and not self.released and self.pulling_thread != threading.get_ident():
+                self.condition.wait()
+            return samples
+
+        if self.policy == "drop_newest":
+            kept = samples[:max(0, self.capacity - len(self.array))]
+            self.samples_dropped += len(samples) - len(kept)
+            return kept
+
+        excess = len(self.array) + len(samples) - self.capacity
+        if excess > 0:
+            buffered_excess = min(excess, len(self.array))
+            self.array = self.array[buffered_excess:]
+            samples = samples[excess - buffered_excess:]
+            self.samples_dropped += excess
+        return samples
+
+    def release(self, released=True):
+        # A released buffer stops blocking its writers, so a stopping graph can't hang on a full edge
+        with self.condition:
+            self.released = released
+            self.condition.notify_all()
 
 
 
@@ -26,10 +82,13 @@ class NodeInput:
     def __init__(self):
         self.producer = None
         self.buffer = Buffer()
+        # Running sample position, with an optional log of (time, start, end) per read for latency tracing
+        self.position = 0
+        self.trace = None
 
-    def assignProducer(self, producer):
+    def assignProducer(self, producer, capacity=None, policy="block"):
         self.producer = producer
-        producer.registerConsumer(self)
+        producer.registerConsumer(self, capacity, policy)
 
     def read(self, sample_count):
         available_amount = min(sample_count, self.buffer.getSampleCount())
@@ -39,6 +98,9 @@ class NodeInput:
             samples = numpy.concatenate([samples, self.producer.read(missing_amount, self)])
         else:
             samples = numpy.concatenate([samples, numpy.zeros(missing_amount)])
+        if self.trace is not None:
+            self.trace.append((time.perf_counter(), self.position, self.position + len(samples)))
+        self.position += len(samples)
         return samples
     
     def write(self, samples):
@@ -53,20 +115,46 @@ class NodeOutput:
         self.thread_lock = threading.Lock()
         self.buffers = {}
         self.locked = False
+        self.read_listeners = []
+        self.position = 0
+        self.trace = None
+
+    def registerConsumer(self, consumer, capacity=None, policy="block"):
+        # With the block policy, a consumer that reads more than the capacity at once can stall behind a sibling
+        self.buffers[consumer] = Buffer(capacity, policy)
+
+    def getByteCount(self):
+        return sum(buffer.getByteCount() for buffer in self.buffers.values())
 
-    def registerConsumer(self, consumer):
-        self.buffers[consumer] = Buffer()
+    def getSampleIndices(self, sample_count):
+        # Indices of the next samples written here, nodes take their sample time from this rather than a counter of
+        # their own, so it is the same index latency tracing records and seconds are only derived where needed
+        return numpy.arange(self.position, self.position + sample_count)
+
+    def addReadListener(self, listener):
+        self.read_listeners.append(listener)
 
     def read(self, sample_count, consumer):
         buffer = self.buffers[consumer]
-        self.thread_lock.acquire()
-        if buffer.getSampleCount() < sample_count:
-            self.parent_node.work(sample_count - buffer.getSampleCount())
-        samples = buffer.read(sample_count)
-        self.thread_lock.release()
+        if buffer.getSampleCount() >= sample_count:
+            # Nothing has to be produced, so the read doesn't wait for a producer that may be blocked on this very buffer
+            samples = buffer.read(sample_count)
+        else:
+            self.thread_lock.acquire()
+            if buffer.getSampleCount() < sample_count:
+                buffer.pulling_thread = threading.get_ident()
+                self.parent_node.work(sample_count - buffer.getSampleCount())
+                buffer.pulling_thread = None
+            samples = buffer.read(sample_count)
+            self.thread_lock.release()
+        for listener in self.read_listeners:
+            listener()
         return samples
 
     def write(self, samples):
+        if self.trace is not None:
+            self.trace.append((time.perf_counter(), self.position, self.position + len(samples)))
+        self.position += len(samples)
         for buffer in self.buffers.values():
             buffer.write(samples)
 
@@ -74,9 +162,28 @@ class NodeOutput:
 
 class BaseNode:
 
+    # Attributes that carry state from one work() call to the next, saved by Graph.snapshot
+    state_attributes = ()
+
     def __init__(self):
         self.inputs = {}
         self.outputs = {}
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _startThread(self, target):
+        self.thread = threading.Thread(target=target, name=type(self).__name__, daemon=True)
+        self.thread.start()
+
+    def start(self):
+        self.stopped.clear()
+
+    def stop(self):
+        self.stopped.set()
+
+    def join(self, timeout=None):
+        if self.thread != None and self.thread.is_alive():
+            self.thread.join(timeout)
 
     def defineInput(self, key):
         self.inputs[key] = NodeInput()
@@ -92,6 +199,33 @@ class BaseNode:
 
 
 
+class ElementwiseNode(BaseNode):
+
+    # Graph.fuseElementwise leaves nodes alone that are observed through their own ports or state, like the plotters
+    fusable = True
+
+    def __init__(self, input_keys, output_key, rate=1):
+        super().__init__()
+        for key in input_keys:
+            self.defineInput(key)
+        self.defineOutput(output_key)
+
+        self.input_keys = input_keys
+        self.output_key = output_key
+        self.rate = rate
+
+    def work(self, sample_count):
+        input_amount = math.ceil(sample_count / self.rate)
+        operands = [self.inputs[key].read(input_amount) for key in self.input_keys]
+        self.outputs[self.output_key].write(self.kernel(*operands))
+
+    # Subclasses override this, by default the first operand passes through unchanged;
+    # operands are freshly read arrays owned by the caller, so kernels may overwrite them in place
+    def kernel(self, *operands):
+        return operands[0]
+
+
+
 """
 class StandaloneNode:
 
@@ -0,0 +1,175 @@
+from .nodes import BaseNode, Buffer
+import numpy
+
+
+
+class OFDMFormat:
+
+    def __init__(self, fft_size=512, cyclic_prefix=64, first_bin=12, carrier_count=40, pilot_spacing=4, bits_per_carrier=2, symbols_per_frame=16, gap_length=512, seed=1):
+        if bits_per_carrier not in (1, 2):
+            raise ValueError("Only BPSK (1) and QPSK (2) carriers are supported")
+
+        self.fft_size = fft_size
+        self.cyclic_prefix = cyclic_prefix
+        self.bits_per_carrier = bits_per_carrier
+        self.symbols_per_frame = symbols_per_frame
+        self.gap_length = gap_length
+
+        self.carriers = first_bin + numpy.arange(carrier_count)
+        is_pilot = numpy.arange(carrier_count) % pilot_spacing == 0
+        # The last carrier is always a pilot so channel estimates never have to be extrapolated
+        is_pilot[-1] = True
+        self.pilot_carriers = self.carriers[is_pilot]
+        self.data_carriers = self.carriers[~is_pilot]
+
+        random = numpy.random.default_rng(seed)
+        self.pilot_values = 1 - 2 * random.integers(0, 2, len(self.pilot_carriers)).astype(float)
+        # The sync symbol only uses even bins, which makes its two halves identical
+        self.sync_carriers = self.carriers[self.carriers % 2 == 0]
+        self.sync_values = 1 - 2 * random.integers(0, 2, len(self.sync_carriers)).astype(float)
+
+        self.symbol_length = cyclic_prefix + fft_size
+        self.frame_length = (1 + symbols_per_frame) * self.symbol_length + gap_length
+        self.bits_per_frame = symbols_per_frame * len(self.data_carriers) * bits_per_carrier
+
+    def getBitRate(self, sample_rate):
+        return self.bits_per_frame * sample_rate / self.frame_length
+
+    def modulateCarriers(self, bits):
+        bits = bits.reshape(-1, self.bits_per_carrier)
+        if self.bits_per_carrier == 1:
+            return 1 - 2 * bits[:, 0]
+        return ((1 - 2 * bits[:, 0]) + 1j * (1 - 2 * bits[:, 1])) / numpy.sqrt(2)
+
+    def demodulateCarriers(self, values):
+        if self.bits_per_carrier == 1:
+            return (values.real < 0).astype(float)
+        return numpy.stack([values.real < 0, values.imag < 0], axis=-1).astype(float).reshape(-1)
+
+
+
+class OFDMModulator(BaseNode):
+
+    state_attributes = ("buffer",)
+
+    def __init__(self, ofdm_format, amplitude=0.25):
+        super().__init__()
+        self.defineInput("bits")
+        self.defineOutput("modulated")
+
+        self.format = ofdm_format
+        self.amplitude = amplitude
+        self.buffer = Buffer()
+
+        spectrum = numpy.zeros(ofdm_format.fft_size // 2 + 1, dtype=complex)
+        spectrum[ofdm_format.sync_carriers] = ofdm_format.sync_values
+        self.sync_symbol = self._addPrefix(self._scale(numpy.fft.irfft(spectrum, ofdm_format.fft_size)[None]))[0]
+
+    def _scale(self, symbols):
+        # Normalized to the same RMS on every symbol, whatever the number of active carriers
+        return symbols * self.amplitude / numpy.sqrt(numpy.mean(numpy.square(symbols), axis=-1, keepdims=True))
+
+    def _addPrefix(self, symbols):
+        return numpy.concatenate([symbols[:, -self.format.cyclic_prefix:], symbols], axis=1)
+
+    def _modulateFrame(self, bits):
+        ofdm_format = self.format
+        symbol_count = ofdm_format.symbols_per_frame
+        spectra = numpy.zeros((symbol_count, ofdm_format.fft_size // 2 + 1), dtype=complex)
+        spectra[:, ofdm_format.pilot_carriers] = ofdm_format.pilot_values
+        spectra[:, ofdm_format.data_carriers] = ofdm_format.modulateCarriers(bits).reshape(symbol_count, -1)
+        symbols = self._addPrefix(self._scale(numpy.fft.irfft(spectra, ofdm_format.fft_size, axis=1)))
+        gap = numpy.zeros(ofdm_format.gap_length)
+        return numpy.concatenate([self.sync_symbol, symbols.reshape(-1), gap])
+
+    def work(self, sample_count):
+        while self.buffer.getSampleCount() < sample_count:
+            bits = self.inputs["bits"].read(self.format.bits_per_frame) > 0
+            self.buffer.write(self._modulateFrame(bits.astype(int)))
+        self.outputs["modulated"].write(self.buffer.read(sample_count))
+
+
+
+class OFDMDemodulator(BaseNode):
+
+    state_attributes = ("samples", "bits", "frame_count")
+
+    def __init__(self, ofdm_format, block_size=4096, threshold=0.6, minimum_power=1e-6):
+        super().__init__()
+        self.defineInput("modulated")
+        self.defineOutput("bits")
+
+        self.format = ofdm_format
+        self.block_size = block_size
+        self.threshold = threshold
+        self.minimum_power = minimum_power
+
+        self.samples = numpy.zeros(0)
+        self.bits = Buffer()
+        self.frame_count = 0
+
+    def _syncMetric(self, samples):
+        # Schmidl-Cox timing metric for every start position, using running sums over half a symbol
+        half = self.format.fft_size // 2
+        products = numpy.concatenate([[0], numpy.cumsum(samples[:-half] * samples[half:])])
+        energies = numpy.concatenate([[0], numpy.cumsum(numpy.square(samples[half:]))])
+        correlation = products[half:] - products[:-half]
+        energy = energies[half:] - energies[:-half]
+        metric = numpy.square(correlation) / numpy.maximum(numpy.square(energy), 1e-30)
+        metric[energy / half < self.minimum_power] = 0
+        return metric
+
+    def _findFrame(self):
+        ofdm_format = self.format
+        if len(self.samples) < ofdm_format.frame_length + ofdm_format.symbol_length:
+            return None
+        metric = self._syncMetric(self.samples)
+        candidates = numpy.flatnonzero(metric > self.threshold)
+        if len(candidates) == 0:
+            self.samples = self.samples[-ofdm_format.symbol_length:]
+            return None
+
+        first = candidates[0]
+        if first + ofdm_format.frame_length + ofdm_format.symbol_length > len(self.samples):
+            self.samples = self.samples[first:]
+            return None
+
+        # The metric plateaus over the cyclic prefix of the sync symbol, its middle is a safe timing point
+        region = metric[first:first + ofdm_format.symbol_length]
+        plateau = numpy.flatnonzero(region >= 0.9 * numpy.max(region))
+        center = first + (plateau[0] + plateau[-1]) // 2
+        body_start = center + ofdm_format.cyclic_prefix // 2
+        return body_start
+
+    def _demodulateFrame(self, body_start):
+        ofdm_format = self.format
+        symbol_starts = body_start + ofdm_format.fft_size + ofdm_format.cyclic_prefix + ofdm_format.symbol_length * numpy.arange(ofdm_format.symbols_per_frame)
+        symbols = self.samples[symbol_starts[:, None] + numpy.arange(ofdm_format.fft_size)]
+        spectra = numpy.fft.rfft(symbols, axis=1)
+
+        # A timing error is a phase ramp across carriers, estimate it from neighbouring pilots and undo it
+        pilots = spectra[:, ofdm_format.pilot_carriers] * ofdm_format.pilot_values
+        steps = numpy.diff(ofdm_format.pilot_carriers)
+        rotation = numpy.sum(pilots[:, 1:] * pilots[:, :-1].conjugate() * (steps == steps[0]))
+        slope = numpy.angle(rotation) / steps[0]
+        derotation = numpy.exp(-1j * slope * numpy.arange(spectra.shape[1]))
+        spectra = spectra * derotation
+        pilots = pilots * derotation[ofdm_format.pilot_carriers]
+
+        channel_real = numpy.array([numpy.interp(ofdm_format.data_carriers, ofdm_format.pilot_carriers, row) for row in pilots.real])
+        channel_imag = numpy.array([numpy.interp(ofdm_format.data_carriers, ofdm_format.pilot_carriers, row) for row in pilots.imag])
+        channel = channel_real + 1j * channel_imag
+        equalized = spectra[:, ofdm_format.data_carriers] / channel
+        return ofdm_format.demodulateCarriers(equalized.reshape(-1))
+
+    def work(self, sample_count):
+        while self.bits.getSampleCount() < sample_count:
+            body_start = self._findFrame()
+            if body_start == None:
+                self.samples = numpy.concatenate([self.samples, self.inputs["modulated"].read(self.block_size).real])
+                continue
+            self.bits.write(self._demodulateFrame(body_start))
+            self.frame_count += 1
+            frame_end = body_start - self.format.cyclic_prefix + self.format.frame_length
+            self.samples = self.samples[frame_end - self.format.gap_length:]
+        self.outputs["bits"].write(self.bits.read(sample_count))
@@ -0,0 +1,312 @@
+from .nodes import BaseNode
+import collections
+import threading
+import numpy
+import time
+
+
+
+class CRC:
+
+    def __init__(self, width, polynomial, initial, reflected, final_xor):
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.initial = initial
+        self.reflected = reflected
+        self.final_xor = final_xor
+
+        table = []
+        for byte in range(256):
+            if reflected:
+                value = byte
+                for _ in range(8):
+                    value = (value >> 1) ^ polynomial if value & 1 else value >> 1
+            else:
+                value = byte << (width - 8)
+                for _ in range(8):
+                    value = ((value << 1) ^ polynomial if value & (1 << (width - 1)) else value << 1) & self.mask
+            table.append(value)
+        self.table = numpy.array(table, dtype=numpy.uint64)
+
+    def computeBatch(self, rows, lengths=None):
+        # One CRC per row, rows past their length are left alone so variable-length packets share a batch
+        rows = numpy.asarray(rows, dtype=numpy.uint8)
+        crc = numpy.full(len(rows), self.initial, dtype=numpy.uint64)
+        shift = numpy.uint64(self.width - 8)
+        mask = numpy.uint64(self.mask)
+        for column in range(rows.shape[1]):
+            data = rows[:, column].astype(numpy.uint64)
+            if self.reflected:
+                updated = (crc >> numpy.uint64(8)) ^ self.table[(crc ^ data) & numpy.uint64(0xFF)]
+            else:
+                updated = ((crc << numpy.uint64(8)) & mask) ^ self.table[((crc >> shift) ^ data) & numpy.uint64(0xFF)]
+            crc = updated if lengths is None else numpy.where(column < lengths, updated, crc)
+        return crc ^ numpy.uint64(self.final_xor)
+
+    def compute(self, data):
+        return int(self.computeBatch(numpy.frombuffer(bytes(data), dtype=numpy.uint8)[None])[0])
+
+
+
+CRC16 = CRC(16, 0x1021, 0xFFFF, False, 0x0000)
+CRC32 = CRC(32, 0xEDB88320, 0xFFFFFFFF, True, 0xFFFFFFFF)
+
+
+
+class Packet:
+
+    DATA = 0
+    ACK = 1
+    # Sent in place of a packet the sender gave up on, so the receiver stops waiting for it
+    SKIP = 2
+
+    def __init__(self, kind, sequence, payload=b"", station=0):
+        self.kind = kind
+        self.sequence = sequence
+        self.payload = bytes(payload)
+        # The sending endpoint, on a shared channel every endpoint also hears its own frames
+        self.station = station
+
+
+
+def _toBits(data):
+    return numpy.unpackbits(numpy.frombuffer(bytes(data), dtype=numpy.uint8))
+
+
+
+class Framer:
+
+    HEADER_LENGTH = 7
+    MAX_PAYLOAD = 0xFFFF
+
+    def __init__(self, sync=0xC1FA, sync_length=16, preamble_length=16):
+        self.sync_bits = ((sync >> numpy.arange(sync_length - 1, -1, -1)) & 1).astype(numpy.uint8)
+        self.preamble = numpy.zeros(preamble_length, dtype=numpy.uint8)
+
+    def frame(self, packet):
+        if len(packet.payload) > self.MAX_PAYLOAD:
+            raise ValueError(f"Payloads are limited to {self.MAX_PAYLOAD} bytes")
+        # The header has its own CRC so a corrupted length is caught before waiting for a payload that never comes
+        header = bytes([packet.kind, packet.station, packet.sequence]) + len(packet.payload).to_bytes(2, "big")
+        header += CRC16.compute(header).to_bytes(2, "big")
+        trailer = CRC32.compute(header[:5] + packet.payload).to_bytes(4, "big")
+        return numpy.concatenate([self.preamble, self.sync_bits, _toBits(header + packet.payload + trailer)])
+
+
+
+class Deframer:
+
+    def __init__(self, sync=0xC1FA, sync_length=16, max_payload=1024):
+        self.sync_bits = ((sync >> numpy.arange(sync_length - 1, -1, -1)) & 1).astype(numpy.uint8)
+        self.max_payload = max_payload
+        self.bits = numpy.zeros(0, dtype=numpy.uint8)
+        self.header_errors = 0
+        self.payload_errors = 0
+
+    def _headers(self, starts):
+        header_bits = self.bits[starts[:, None] + numpy.arange(8 * Framer.HEADER_LENGTH)]
+        headers = numpy.packbits(header_bits, axis=1)
+        received = (headers[:, 5].astype(numpy.uint64) << numpy.uint64(8)) | headers[:, 6].astype(numpy.uint64)
+        valid = CRC16.computeBatch(headers[:, :5]) == received
+        lengths = (headers[:, 3].astype(int) << 8) | headers[:, 4]
+        return headers, valid & (lengths <= self.max_payload), lengths
+
+    def write(self, bits):
+        self.bits = numpy.concatenate([self.bits, (numpy.asarray(bits) > 0).astype(numpy.uint8)])
+        sync_length = len(self.sync_bits)
+        header_bit_count = 8 * Framer.HEADER_LENGTH
+        if len(self.bits) < sync_length:
+            return []
+
+        windows = numpy.lib.stride_tricks.sliding_window_view(self.bits, sync_length)
+        starts = numpy.flatnonzero(numpy.all(windows == self.sync_bits, axis=1)) + sync_length
+        complete = starts[starts + header_bit_count <= len(self.bits)]
+
+        # Headers of every candidate are checked in one batch, payloads of the complete ones in another
+        packets = []
+        consumed = len(self.bits) - sync_length + 1
+        last_end = 0
+        if len(complete) > 0:
+            headers, valid, lengths = self._headers(complete)
+            ends = complete + 8 * (Framer.HEADER_LENGTH + lengths + 4)
+            ready = valid & (ends <= len(self.bits))
+            crcs = {}
+            if numpy.any(ready):
+                rows = numpy.flatnonzero(ready)
+                longest = int(numpy.max(lengths[rows]))
+                frame_bits = self.bits[numpy.minimum(complete[rows, None] + numpy.arange(8 * (Framer.HEADER_LENGTH + longest + 4)), len(self.bits) - 1)]
+                frames = numpy.packbits(frame_bits, axis=1)
+                # The CRC covers the first five header bytes and the payload, which sit apart in the frame
+                covered = numpy.concatenate([frames[:, :5], frames[:, Framer.HEADER_LENGTH:]], axis=1)
+                crcs = dict(zip(rows, CRC32.computeBatch(covered, 5 + lengths[rows])))
+
+            for index, start in enumerate(complete):
+                if start - sync_length < last_end:
+                    continue
+                if not valid[index]:
+                    self.header_errors += 1
+                    continue
+                if not ready[index]:
+                    # Everything from here on waits for the rest of this frame
+                    consumed = start - sync_length
+                    break
+                payload_start = start + 8 * Framer.HEADER_LENGTH
+                payload_end = payload_start + 8 * lengths[index]
+                payload = numpy.packbits(self.bits[payload_start:payload_end]).tobytes()
+                trailer = numpy.packbits(self.bits[payload_end:ends[index]]).tobytes()
+                if int.from_bytes(trailer, "big") != int(crcs[index]):
+                    self.payload_errors += 1
+                    continue
+                packets.append(Packet(int(headers[index, 0]), int(headers[index, 2]), payload, int(headers[index, 1])))
+                last_end = ends[index]
+
+        # A sync word whose header hasn't fully arrived yet is kept for the next call
+        incomplete = starts[len(complete):]
+        if len(incomplete) > 0:
+            consumed = min(consumed, incomplete[0] - sync_length)
+        self.bits = self.bits[max(consumed, last_end, 0):]
+        return packets
+
+
+
+class SelectiveRepeatARQ:
+
+    SEQUENCE_COUNT = 256
+
+    def __init__(self, station, peer, window_size=16, timeout=2.0, max_attempts=None):
+        # A window larger than half the sequence space can't tell a retransmission from a new packet
+        if not 0 < window_size <= self.SEQUENCE_COUNT // 2:
+            raise ValueError(f"The window size has to be between 1 and {self.SEQUENCE_COUNT // 2}")
+        # On a shared channel every endpoint hears its own frames too, only the station tells them apart
+        if station == peer:
+            raise ValueError(f"Both endpoints use station {station}, they would ignore each other")
+
+        self.window_size = window_size
+        self.timeout = timeout
+        self.station = station
+        self.peer = peer
+        self.max_attempts = max_attempts
+        self.lock = threading.Condition()
+
+        self.pending = collections.deque()
+        self.in_flight = {}
+        self.send_base = 0
+        self.next_sequence = 0
+
+        self.receive_base = 0
+        self.out_of_order = {}
+        self.delivered = collections.deque()
+        self.acks = collections.deque()
+
+        self.stats = {"sent": 0, "retransmitted": 0, "dropped": 0, "acked": 0, "delivered": 0, "skipped": 0, "duplicates": 0}
+
+    def send(self, payload):
+        with self.lock:
+            self.pending.append(bytes(payload))
+
+    def getOutstandingCount(self):
+        with self.lock:
+            return len(self.pending) + len(self.in_flight)
+
+    def poll(self, now=None):
+        # Returns every packet that is due now: acknowledgements first, then timed out and finally new packets
+        if now == None:
+            now = time.monotonic()
+        with self.lock:
+            packets = [Packet(Packet.ACK, sequence, station=self.station) for sequence in self.acks]
+            self.acks.clear()
+
+            for sequence, entry in list(self.in_flight.items()):
+                if now - entry["sent"] < self.timeout:
+                    continue
+                if not entry["skip"] and self.max_attempts != None and entry["attempts"] >= self.max_attempts:
+                    # The window only moves past it once the peer has acknowledged the skip
+                    entry["skip"] = True
+                    entry["payload"] = b""
+                    self.stats["dropped"] += 1
+                elif not entry["skip"]:
+                    self.stats["retransmitted"] += 1
+                entry["sent"] = now
+                entry["attempts"] += 1
+                packets.append(Packet(Packet.SKIP if entry["skip"] else Packet.DATA, sequence, entry["payload"], self.station))
+            self._advanceSendBase()
+
+            while self.pending and (self.next_sequence - self.send_base) % self.SEQUENCE_COUNT < self.window_size:
+                payload = self.pending.popleft()
+                sequence = self.next_sequence
+                self.in_flight[sequence] = {"payload": payload, "sent": now, "attempts": 1, "skip": False}
+                self.next_sequence = (sequence + 1) % self.SEQUENCE_COUNT
+                self.stats["sent"] += 1
+                packets.append(Packet(Packet.DATA, sequence, payload, self.station))
+            return packets
+
+    def _advanceSendBase(self):
+        while self.send_base != self.next_sequence and self.send_base not in self.in_flight:
+            self.send_base = (self.send_base + 1) % self.SEQUENCE_COUNT
+
+    def receive(self, packet):
+        if packet.station != self.peer:
+            # Our own frame heard back on a half-duplex link, or another station's
+            return
+        with self.lock:
+            if packet.kind == Packet.ACK:
+                if self.in_flight.pop(packet.sequence, None) != None:
+                    self.stats["acked"] += 1
+                    self._advanceSendBase()
+                return
+
+            offset = (packet.sequence - self.receive_base) % self.SEQUENCE_COUNT
+            if offset < self.window_size:
+                if packet.sequence in self.out_of_order:
+                    self.stats["duplicates"] += 1
+                self.out_of_order[packet.sequence] = None if packet.kind == Packet.SKIP else packet.payload
+                while self.receive_base in self.out_of_order:
+                    payload = self.out_of_order.pop(self.receive_base)
+                    self.receive_base = (self.receive_base + 1) % self.SEQUENCE_COUNT
+                    if payload is None:
+                        self.stats["skipped"] += 1
+                        continue
+                    self.delivered.append(payload)
+                    self.stats["delivered"] += 1
+                self.lock.notify_all()
+            elif offset < self.SEQUENCE_COUNT - self.window_size:
+                # Neither inside the window nor an old packet, the sender can't have sent it
+                return
+            else:
+                # Already delivered, the acknowledgement must have been lost
+                self.stats["duplicates"] += 1
+            self.acks.append(packet.sequence)
+
+    def read(self, timeout=None):
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.delivered, timeout):
+                return None
+            return self.delivered.popleft()
+
+
+
+class PacketLink(BaseNode):
+
+    def __init__(self, endpoint, transmit, block_size, framer=None, deframer=None):
+        super().__init__()
+        self.defineInput("received")
+
+        # transmit is called with the bits of every outgoing frame, e.g. to write them into a GracefulInputBuffer
+        self.endpoint = endpoint
+        self.transmit = transmit
+        self.block_size = block_size
+        self.framer = framer or Framer()
+        self.deframer = deframer or Deframer()
+
+    def _loop(self):
+        # Reading a block blocks for about its duration on a live link, which paces the polling as well
+        while not self.stopped.is_set():
+            for packet in self.endpoint.poll():
+                self.transmit(self.framer.frame(packet))
+            received = self.inputs["received"].read(self.block_size)
+            for packet in self.deframer.write(received):
+                self.endpoint.receive(packet)
+
+    def start(self):
+        super().start()
+        self._startThread(self._loop)
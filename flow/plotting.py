@@ -1,23 +1,23 @@
-import matplotlib.pyplot
-import matplotlib.ticker
-import matplotlib.backend_bases
 import numpy
 import threading
-from .nodes import BaseNode
-from .dsp import Oscillator, Clock
-import time
+from .nodes import BaseNode, ElementwiseNode
+from .dsp import Oscillator
 
 
 
 class PyplotFigure:
 
     def __init__(self, size):
+        import matplotlib.pyplot
+        import matplotlib.backend_bases
+
         matplotlib.backend_bases.NavigationToolbar2.home = self.resetViews
 
         self.figure, self.axes = matplotlib.pyplot.subplots(size[0], size[1])
         self.plotters = {}
 
-        self.thread = threading.Thread(target=self._threadLoop)
+        self.stopped = threading.Event()
+        self.thread = None
     
     def initialize(self):
         for location, plotter in self.plotters.items():
@@ -39,49 +39,56 @@ class PyplotFigure:
         self.figure.canvas.draw_idle()
 
     def _threadLoop(self):
-        while True:
+        while not self.stopped.wait(0.1):
             self.update()
-            time.sleep(0.1)
     
     def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._threadLoop, name="PyplotFigure", daemon=True)
         self.thread.start()
 
+    def stop(self):
+        self.stopped.set()
 
+    def join(self, timeout=None):
+        if self.thread != None:
+            self.thread.join(timeout)
 
-class TimePlotter(BaseNode):
 
-    def __init__(self, sample_rate, window_size, amplitude_range):
-        super().__init__()
-        self.defineInput("samples")
-        self.defineOutput("samples")
 
-        self.clock = Clock(sample_rate, -window_size / sample_rate)
-        self.clock.outputs["time"].registerConsumer(self)
+class TimePlotter(ElementwiseNode):
+
+    # The figure thread draws from the rolling window, so the plotter keeps its own node and ports
+    fusable = False
+
+    def __init__(self, sample_rate, window_size, amplitude_range):
+        super().__init__(["samples"], "samples")
 
         self.sample_rate = sample_rate
         self.window_size = window_size
         self.window = numpy.zeros(window_size)
-        self.window_time = self.clock.outputs["time"].read(self.window_size, self)
+        self.window_time = numpy.arange(-window_size, 0) / sample_rate
 
         self.thread_lock = threading.Lock()
 
         self.amplitude_range = amplitude_range
 
-    def work(self, sample_count):
-        samples = self.inputs["samples"].read(sample_count)
-        self.outputs["samples"].write(samples)
-        
-        time = self.clock.outputs["time"].read(sample_count, self)[-self.window_size:]
+    def kernel(self, samples):
+        recent_count = min(len(samples), self.window_size)
+        # The plotter is never fused, so its output position is where this block starts
+        time = self.outputs["samples"].getSampleIndices(len(samples))[len(samples) - recent_count:] / self.sample_rate
         window_time = numpy.concatenate([self.window_time[self.window_size - (self.window_size - len(time)):], time])
         
-        samples = samples[-self.window_size:].real        
-        window = numpy.concatenate([self.window[self.window_size - (self.window_size - len(samples)):], samples])
+        recent = samples[-self.window_size:].real        
+        window = numpy.concatenate([self.window[self.window_size - (self.window_size - len(recent)):], recent])
 
         self.thread_lock.acquire()
         self.window_time = window_time
         self.window = window
         self.thread_lock.release()
 
+        return samples
+
     def initialize(self, axes):
         self.line = axes.plot([], [])[0]
 
@@ -97,6 +104,8 @@ class TimePlotter(BaseNode):
         axes.set_ylim(-self.amplitude_range, self.amplitude_range)
 
     def plot(self, axes):
+        import matplotlib.ticker
+
         self.thread_lock.acquire()
         x = self.window_time.copy()
         y = self.window.copy()
@@ -118,58 +127,145 @@ class TimePlotter(BaseNode):
 
 
 
-class FrequencyPlotter(BaseNode):
+class FrequencyPlotter(ElementwiseNode):
 
-    def __init__(self, sample_rate, window_size, amplitude_range):
-        super().__init__()
-        self.defineInputs(["samples"])
-        self.defineOutputs(["samples"])
+    fusable = False
+
+    def __init__(self, sample_rate, window_size, amplitude_range, average_count=8, complex_input=False):
+        super().__init__(["samples"], "samples")
 
         self.sample_rate = sample_rate
         self.window_size = window_size
-        self.window = numpy.zeros(window_size)
+        self.hop_size = window_size // 2
+        self.average_count = average_count
+        self.complex_input = complex_input
 
         self.amplitude_range = amplitude_range
 
-        self.window_frequency = numpy.fft.fftshift(numpy.fft.fftfreq(self.window_size, d=1 / sample_rate))
+        self.taper = numpy.hanning(window_size)
+        if complex_input:
+            self.window_frequency = numpy.fft.fftshift(numpy.fft.fftfreq(window_size, d=1 / sample_rate))
+            self.scale = 1 / numpy.sum(self.taper)
+        else:
+            self.window_frequency = numpy.fft.rfftfreq(window_size, d=1 / sample_rate)
+            self.scale = 2 / numpy.sum(self.taper)
+
+        bin_count = len(self.window_frequency)
+        self.pending = numpy.zeros(0, dtype=complex if complex_input else float)
+        self.periodograms = numpy.zeros((average_count, bin_count))
+        self.power_sum = numpy.zeros(bin_count)
+        self.periodogram_index = 0
+        self.spectrum = numpy.zeros(bin_count)
 
         self.thread_lock = threading.Lock()
-    
+
     def initialize(self, axes):
         self.line = axes.plot([], [])[0]
 
         x = self.window_frequency
-        y = numpy.zeros(self.window_size)
+        y = numpy.zeros(len(x))
         self.line.set_data(x, y)
 
         self.resetView(axes)
-    
+
     def resetView(self, axes):
         x = self.window_frequency
         axes.set_xlim(x[0], x[-1])
         axes.set_ylim(0, self.amplitude_range)
 
-    def work(self, sample_count):
-        samples = self.inputs["samples"].read(sample_count)
-        self.outputs["samples"].write(samples)
+    def kernel(self, samples):
+        self._accumulate(samples)
+        return samples
+
+    def _accumulate(self, samples):
+        if not self.complex_input:
+            samples = samples.real
+        pending = numpy.concatenate([self.pending, samples])
+        segment_count = max(0, (len(pending) - self.window_size) // self.hop_size + 1)
+        if segment_count == 0:
+            self.pending = pending
+            return
+
+        # Keep only the newest segments that still fit into the average
+        first_segment = max(0, segment_count - self.average_count)
+        starts = numpy.arange(first_segment, segment_count) * self.hop_size
+        segments = pending[starts[:, None] + numpy.arange(self.window_size)] * self.taper
+        if self.complex_input:
+            transformed = numpy.fft.fftshift(numpy.fft.fft(segments), axes=-1)
+        else:
+            transformed = numpy.fft.rfft(segments)
+        powers = numpy.square(numpy.absolute(transformed) * self.scale)
+        self.pending = pending[segment_count * self.hop_size:]
+
+        for power in powers:
+            self.power_sum += power - self.periodograms[self.periodogram_index]
+            self.periodograms[self.periodogram_index] = power
+            self.periodogram_index = (self.periodogram_index + 1) % self.average_count
+            if self.periodogram_index == 0:
+                # Recompute the running sum once per cycle so rounding errors don't accumulate
+                self.power_sum = numpy.sum(self.periodograms, axis=0)
+                self._publishAverage(numpy.sqrt(self.power_sum / self.average_count))
+
+        spectrum = numpy.sqrt(numpy.maximum(self.power_sum, 0) / self.average_count)
+        self.thread_lock.acquire()
+        self.spectrum = spectrum
+        self.thread_lock.release()
 
-        samples = samples[-self.window_size:].real
-        window = numpy.concatenate([self.window[self.window_size - (self.window_size - len(samples)):], samples])
+    def _publishAverage(self, spectrum):
+        pass
 
+    def plot(self, axes):
         self.thread_lock.acquire()
-        self.window = window
+        y = self.spectrum
+        self.thread_lock.release()
+
+        self.line.set_data(self.window_frequency, y)
+
+
+
+class WaterfallPlotter(FrequencyPlotter):
+
+    def __init__(self, sample_rate, window_size, amplitude_range, history_size, average_count=8, complex_input=False, dynamic_range=60):
+        super().__init__(sample_rate, window_size, amplitude_range, average_count, complex_input)
+
+        self.history_size = history_size
+        self.dynamic_range = dynamic_range
+        self.row_duration = self.hop_size * average_count / sample_rate
+        self.floor = 10 ** ((20 * numpy.log10(amplitude_range) - dynamic_range) / 20)
+        self.history = numpy.full((history_size, len(self.window_frequency)), 20 * numpy.log10(self.floor))
+        self.history_index = 0
+
+    def _publishAverage(self, spectrum):
+        row = 20 * numpy.log10(numpy.maximum(spectrum, self.floor))
+        self.thread_lock.acquire()
+        self.history[self.history_index] = row
+        self.history_index = (self.history_index + 1) % self.history_size
         self.thread_lock.release()
 
+    def initialize(self, axes):
+        top = 20 * numpy.log10(self.amplitude_range)
+        self.image = axes.imshow(
+            self.history,
+            aspect="auto",
+            origin="lower",
+            interpolation="nearest",
+            vmin=top - self.dynamic_range,
+            vmax=top,
+            extent=(self.window_frequency[0], self.window_frequency[-1], -self.history_size * self.row_duration, 0)
+            )
+
+        self.resetView(axes)
+
+    def resetView(self, axes):
+        axes.set_xlim(self.window_frequency[0], self.window_frequency[-1])
+        axes.set_ylim(-self.history_size * self.row_duration, 0)
+
     def plot(self, axes):
         self.thread_lock.acquire()
-        y = self.window.copy()
+        rows = numpy.roll(self.history, -self.history_index, axis=0)
         self.thread_lock.release()
-        f = self.window_frequency
-        
-        Y = numpy.absolute(numpy.fft.fftshift(numpy.fft.fft(y.real))) / self.window_size * 2
-        
-        self.line.set_data(f, Y)
-        #axes.ticklabel_format(useOffset=False, style="plain")
+
+        self.image.set_data(rows)
 
 
 
@@ -0,0 +1,181 @@
+from .nodes import BaseNode
+from .dsp import Oscillator
+from .mfsk import grayEncode, grayDecode
+from . import kernels
+import numpy
+import math
+
+
+
+def rrcTaps(samples_per_symbol, span, rolloff):
+    # Root-raised-cosine impulse response over span symbols, normalized to unit energy
+    times = numpy.arange(-span * samples_per_symbol / 2, span * samples_per_symbol / 2 + 1) / samples_per_symbol
+    taps = numpy.empty(len(times))
+    for index, time in enumerate(times):
+        if time == 0:
+            taps[index] = 1 - rolloff + 4 * rolloff / numpy.pi
+        elif rolloff > 0 and abs(abs(4 * rolloff * time) - 1) < 1e-9:
+            taps[index] = rolloff / numpy.sqrt(2) * ((1 + 2 / numpy.pi) * numpy.sin(numpy.pi / (4 * rolloff)) + (1 - 2 / numpy.pi) * numpy.cos(numpy.pi / (4 * rolloff)))
+        else:
+            numerator = numpy.sin(numpy.pi * time * (1 - rolloff)) + 4 * rolloff * time * numpy.cos(numpy.pi * time * (1 + rolloff))
+            taps[index] = numerator / (numpy.pi * time * (1 - numpy.square(4 * rolloff * time)))
+    return taps / numpy.sqrt(numpy.sum(numpy.square(taps)))
+
+
+
+class Constellation:
+
+    def __init__(self, bits_per_symbol):
+        # The leading bits of every symbol select a rotation relative to the previous symbol, the rest a point
+        # inside one rotation sector; the receiver then doesn't care which of the symmetric phases its carrier loop locks to
+        if bits_per_symbol in (1, 3):
+            self.symmetry = 1 << bits_per_symbol
+            base = numpy.ones(1, dtype=complex)
+        elif bits_per_symbol % 2 == 0:
+            self.symmetry = 4
+            axis_bits = (bits_per_symbol - 2) // 2
+            codes = numpy.arange(1 << (2 * axis_bits))
+            levels_i = 2 * grayDecode(codes >> axis_bits) + 1
+            levels_q = 2 * grayDecode(codes & ((1 << axis_bits) - 1)) + 1
+            base = levels_i + 1j * levels_q
+        else:
+            raise ValueError("Only BPSK (1), 8-PSK (3) and square QAM (even) constellations are supported")
+
+        self.bits_per_symbol = bits_per_symbol
+        self.rotation_bits = self.symmetry.bit_length() - 1
+        self.base_size = len(base)
+        rotations = numpy.exp(2j * numpy.pi * numpy.arange(self.symmetry) / self.symmetry)
+        self.points = (rotations[:, None] * base).reshape(-1) / numpy.sqrt(numpy.mean(numpy.square(numpy.absolute(base))))
+        self.weights = 1 << numpy.arange(bits_per_symbol - 1, -1, -1)
+        self.bit_shifts = numpy.arange(bits_per_symbol - 1, -1, -1)
+
+    def modulate(self, bits, rotation):
+        values = bits.reshape(-1, self.bits_per_symbol) @ self.weights
+        steps = grayDecode(values >> (self.bits_per_symbol - self.rotation_bits))
+        sectors = (rotation + numpy.cumsum(steps)) % self.symmetry
+        indices = sectors * self.base_size + values % self.base_size
+        return self.points[indices], sectors[-1]
+
+    def demodulate(self, symbols, rotation):
+        indices = numpy.argmin(numpy.absolute(symbols[:, None] - self.points), axis=1)
+        sectors = indices // self.base_size
+        steps = numpy.diff(sectors, prepend=rotation) % self.symmetry
+        values = (grayEncode(steps) << (self.bits_per_symbol - self.rotation_bits)) + indices % self.base_size
+        bits = (values[:, None] >> self.bit_shifts) & 1
+        return bits.reshape(-1).astype(float), sectors[-1]
+
+
+
+class QuadratureAmplitudeModulator(BaseNode):
+
+    state_attributes = ("rotation", "history")
+
+    def __init__(self, bits_per_symbol, carrier_frequency, baud, sample_rate, rolloff=0.35, span=8, amplitude=0.25):
+        super().__init__()
+        self.defineInput("bits")
+        self.defineOutput("modulated")
+
+        if sample_rate % baud != 0:
+            raise ValueError("The sample rate has to be a whole multiple of the baud rate")
+        self.samples_per_symbol = int(sample_rate // baud)
+        self.constellation = Constellation(bits_per_symbol)
+        self.amplitude = amplitude
+        self.rotation = 0
+
+        self.oscillator = Oscillator(carrier_frequency, sample_rate)
+        self.oscillator.outputs["sine"].registerConsumer(self)
+
+        # Polyphase interpolator: row k of the phase matrix holds the taps applied to the symbol k periods back
+        taps = rrcTaps(self.samples_per_symbol, span, rolloff)
+        phase_count = math.ceil(len(taps) / self.samples_per_symbol)
+        padded = numpy.concatenate([taps, numpy.zeros(phase_count * self.samples_per_symbol - len(taps))])
+        self.phases = padded.reshape(phase_count, self.samples_per_symbol)
+        self.history = numpy.zeros(phase_count - 1, dtype=complex)
+
+    def work(self, sample_count):
+        symbol_count = math.ceil(sample_count / self.samples_per_symbol)
+        bits = self.inputs["bits"].read(symbol_count * self.constellation.bits_per_symbol) > 0
+        symbols, self.rotation = self.constellation.modulate(bits.astype(int), self.rotation)
+
+        extended = numpy.concatenate([self.history, symbols])
+        self.history = extended[len(extended) - len(self.history):]
+        windows = numpy.lib.stride_tricks.sliding_window_view(extended, len(self.phases))[:, ::-1]
+        baseband = (windows @ self.phases).reshape(-1)
+
+        carrier = self.oscillator.outputs["sine"].read(len(baseband), self)
+        modulated = numpy.sqrt(2) * self.amplitude * (baseband * carrier).real
+        self.outputs["modulated"].write(modulated)
+
+
+
+class QuadratureAmplitudeDemodulator(BaseNode):
+
+    state_attributes = ("phase", "frequency", "power", "rotation", "symbol_index", "buffer_start", "buffer")
+
+    def __init__(self, bits_per_symbol, carrier_frequency, baud, sample_rate, rolloff=0.35, span=8, loop_bandwidth=0.02, agc_rate=0.1, offset=0):
+        super().__init__()
+        self.defineInput("modulated")
+        self.defineOutput("bits")
+
+        if sample_rate % baud != 0:
+            raise ValueError("The sample rate has to be a whole multiple of the baud rate")
+        self.samples_per_symbol = int(sample_rate // baud)
+        self.constellation = Constellation(bits_per_symbol)
+        self.taps = rrcTaps(self.samples_per_symbol, span, rolloff)
+        self.agc_rate = agc_rate
+        self.offset = offset
+
+        self.oscillator = Oscillator(-carrier_frequency, sample_rate)
+        self.oscillator.outputs["sine"].registerConsumer(self)
+
+        # Second order loop gains for a damping factor of 1/sqrt(2), loop_bandwidth is relative to the symbol rate
+        damping = 1 / numpy.sqrt(2)
+        theta = loop_bandwidth / (damping + 1 / (4 * damping))
+        denominator = 1 + 2 * damping * theta + numpy.square(theta)
+        self.alpha = 4 * damping * theta / denominator
+        self.beta = 4 * numpy.square(theta) / denominator
+
+        self.phase = 0.0
+        self.frequency = 0.0
+        self.power = None
+        self.rotation = 0
+
+        # Symbol k peaks a full filter length after its first sample, the matched filter window then starts
+        # at k * samples_per_symbol; a negative offset is padded with silence like in MFSKDemodulator
+        self.symbol_index = 0
+        self.buffer_start = min(0, offset)
+        self.buffer = numpy.zeros(-self.buffer_start, dtype=complex)
+
+    def _windowStart(self, symbol_indices):
+        return symbol_indices * self.samples_per_symbol + self.offset
+
+    def _mixDown(self, sample_count):
+        modulated = self.inputs["modulated"].read(sample_count)
+        carrier = self.oscillator.outputs["sine"].read(sample_count, self)
+        return numpy.sqrt(2) * modulated * carrier
+
+    def work(self, sample_count):
+        symbol_count = math.ceil(sample_count / self.constellation.bits_per_symbol)
+        starts = self._windowStart(self.symbol_index + numpy.arange(symbol_count))
+        needed = starts[-1] + len(self.taps) - self.buffer_start - len(self.buffer)
+        if needed > 0:
+            self.buffer = numpy.concatenate([self.buffer, self._mixDown(needed)])
+
+        # The matched filter is only evaluated at the symbol instants
+        windows = self.buffer[starts[:, None] - self.buffer_start + numpy.arange(len(self.taps))]
+        symbols = windows @ self.taps
+
+        power = numpy.mean(numpy.square(numpy.absolute(symbols)))
+        if self.power == None:
+            self.power = power
+        self.power += self.agc_rate * (power - self.power)
+        symbols /= numpy.sqrt(max(self.power, 1e-30))
+
+        corrected, self.phase, self.frequency = kernels.trackCarrier(symbols, self.constellation.points, self.phase, self.frequency, self.alpha, self.beta)
+        bits, self.rotation = self.constellation.demodulate(corrected, self.rotation)
+
+        self.symbol_index += symbol_count
+        next_start = self._windowStart(self.symbol_index)
+        self.buffer = self.buffer[next_start - self.buffer_start:]
+        self.buffer_start = next_start
+        self.outputs["bits"].write(bits)
@@ -0,0 +1,188 @@
+from .nodes import BaseNode
+import threading
+import socket
+import struct
+import numpy
+import sys
+import os
+
+
+
+# Magic, format version, numpy dtype string such as "<f4", channel count and sample rate
+HEADER = struct.Struct("<4sB8sHI5x")
+MAGIC = b"FLOW"
+VERSION = 2
+
+# How often a listening socket checks whether its node was stopped
+ACCEPT_INTERVAL = 0.2
+
+
+
+def _openStream(target, mode, listen, stopped):
+    # "-" is stdin or stdout, "unix:<path>" a Unix domain socket, anything else a file or FIFO;
+    # returns the stream and whatever has to be closed with it, or no stream if stopped while listening
+    if target == "-":
+        stream = sys.stdin.buffer if mode == "rb" else sys.stdout.buffer
+        return stream, []
+    if target.startswith("unix:"):
+        path = target[len("unix:"):]
+        if listen:
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if os.path.exists(path):
+                os.unlink(path)
+            server.bind(path)
+            server.listen(1)
+            server.settimeout(ACCEPT_INTERVAL)
+            try:
+                while True:
+                    try:
+                        connection, _ = server.accept()
+                        break
+                    except socket.timeout:
+                        if stopped.is_set():
+                            return None, []
+            finally:
+                server.close()
+            connection.settimeout(None)
+        else:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(path)
+        stream = connection.makefile(mode)
+        return stream, [stream, connection]
+    stream = open(target, mode, buffering=0)
+    return stream, [stream]
+
+
+
+def _readInto(stream, view):
+    # Pipes and sockets hand out whatever has arrived, so this loops until the view is full or the stream ends
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+
+def _writeAll(stream, view):
+    written = 0
+    while written < len(view):
+        count = stream.write(view[written:])
+        written += len(view) - written if count == None else count
+
+
+
+class StreamSource(BaseNode):
+
+    def __init__(self, target, channel_count=1, listen=False):
+        super().__init__()
+        self.defineOutputGroup("samples", channel_count)
+
+        self.target = target
+        self.channel_count = channel_count
+        self.listen = listen
+        self.stream = None
+        self.closers = []
+        self.open_lock = threading.Lock()
+        self.finished = threading.Event()
+
+        # Known once the header has been read
+        self.dtype = None
+        self.sample_rate = None
+        self.frames = numpy.zeros((0, channel_count))
+
+    def _open(self):
+        with self.open_lock:
+            if self.stream != None:
+                return
+            stream, closers = _openStream(self.target, "rb", self.listen, self.stopped)
+            if stream == None:
+                return
+            header = bytearray(HEADER.size)
+            if _readInto(stream, memoryview(header)) < HEADER.size:
+                raise EOFError(f"{self.target}: the stream ended before its header")
+            magic, version, dtype, channel_count, sample_rate = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{self.target}: not a sample stream")
+            if channel_count != self.channel_count:
+                raise ValueError(f"{self.target}: the stream has {channel_count} channels, {self.channel_count} were expected")
+            self.dtype = numpy.dtype(dtype.rstrip(b"\0").decode())
+            self.sample_rate = sample_rate
+            self.stream, self.closers = stream, closers
+
+    def work(self, sample_count):
+        self._open()
+        if self.stream == None:
+            # Stopped before anyone connected
+            self.finished.set()
+            for output in self.outputs["samples"]:
+                output.write(numpy.zeros(sample_count))
+            return
+        if len(self.frames) < sample_count or self.frames.dtype != self.dtype:
+            self.frames = numpy.empty((sample_count, self.channel_count), dtype=self.dtype)
+
+        # Samples are read straight into a reused array, the output buffers copy them anyway
+        frames = self.frames[:sample_count]
+        view = memoryview(frames).cast("B")
+        filled = 0 if self.finished.is_set() else _readInto(self.stream, view)
+        if filled < len(view):
+            # After the end of the stream, like ArraySource, the graph keeps getting silence
+            view[filled:] = bytes(len(view) - filled)
+            self.finished.set()
+        for index in range(self.channel_count):
+            self.outputs["samples"][index].write(frames[:, index])
+
+    def stop(self):
+        super().stop()
+        for closer in self.closers:
+            closer.close()
+
+
+
+class StreamSink(BaseNode):
+
+    def __init__(self, target, block_size, sample_rate, dtype=numpy.float32, channel_count=1, listen=False):
+        super().__init__()
+        self.defineInputGroup("samples", channel_count)
+
+        self.target = target
+        self.block_size = block_size
+        self.sample_rate = sample_rate
+        self.dtype = numpy.dtype(dtype)
+        if len(self.dtype.str) > 8:
+            raise ValueError(f"{self.dtype.str} doesn't fit in the stream header")
+        self.channel_count = channel_count
+        self.listen = listen
+        self.frames = numpy.empty((block_size, channel_count), dtype=self.dtype)
+
+    def _loop(self):
+        stream, closers = _openStream(self.target, "wb", self.listen, self.stopped)
+        if stream == None:
+            return
+        try:
+            _writeAll(stream, HEADER.pack(MAGIC, VERSION, self.dtype.str.encode(), self.channel_count, self.sample_rate))
+            view = memoryview(self.frames).cast("B")
+            while not self.stopped.is_set():
+                for index in range(self.channel_count):
+                    samples = self.inputs["samples"][index].read(self.block_size)
+                    if not numpy.iscomplexobj(self.frames):
+                        samples = samples.real
+                    self.frames[:, index] = samples
+                # One write per block with every channel interleaved
+                _writeAll(stream, view)
+            stream.flush()
+        except BrokenPipeError:
+            pass
+        finally:
+            for closer in closers:
+                try:
+                    closer.close()
+                except BrokenPipeError:
+                    # Whatever was still buffered when the reader went away
+                    pass
+
+    def start(self):
+        super().start()
+        self._startThread(self._loop)
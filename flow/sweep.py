@@ -0,0 +1,147 @@
+from .nodes import NodeInput
+from .basic import ArraySource, NearestNeighbourResampler
+from .dsp import RandomSymbolSource, SineFrequencyModulator, AWGNChannel
+from .batch import Receiver, RECEIVER_DEFAULTS, FRAMING_DEFAULTS, extractFrames
+import concurrent.futures
+import itertools
+import pathlib
+import json
+import math
+import time
+import csv
+import numpy
+
+
+
+SWEEP_DEFAULTS = {
+    "sample_rate": 48000,
+    "frame_count": 50,
+    "preamble_length": 16,
+    "gap_length": 32,
+    "seed": 0,
+    }
+
+RESULT_FIELDS = [
+    "snr", "ecn0", "baud", "deviation", "node_count", "clock_node_count",
+    "frames", "detected", "correct", "bit_errors", "ber", "fer", "goodput",
+    "duration", "cpu_time", "cpu_load",
+    ]
+
+
+
+def makeFrames(payloads, sync, sync_length, preamble_length, gap_length):
+    # Manchester chips as in example.py, with idle carrier between the frames
+    sync_bits = (sync >> numpy.arange(sync_length - 1, -1, -1)) & 1
+    idle = numpy.zeros(2 * gap_length)
+    chips = [idle]
+    for payload in payloads:
+        bits = numpy.concatenate([numpy.zeros(preamble_length, dtype=int), sync_bits, payload])
+        chips.append(numpy.stack([bits, 1 - bits], axis=1).ravel() * 2.0 - 1)
+        chips.append(idle)
+    return numpy.concatenate(chips)
+
+
+
+def matchFrames(payloads, frames, tolerance=0.25):
+    # Decoded frames arrive in order, false syncs inside payloads are far from every transmitted one and get skipped
+    bit_errors = numpy.full(len(payloads), -1)
+    next_frame = 0
+    for frame in frames:
+        received = numpy.unpackbits(numpy.frombuffer(frame["payload"], dtype=numpy.uint8))
+        candidates = payloads[next_frame:next_frame + 4]
+        if len(candidates) == 0:
+            break
+        distances = numpy.sum(candidates != received, axis=1)
+        best = int(numpy.argmin(distances))
+        if distances[best] <= tolerance * len(received):
+            bit_errors[next_frame + best] = distances[best]
+            next_frame += best + 1
+    return bit_errors
+
+
+
+def simulate(configuration, sample_rate, frame_count, preamble_length, gap_length, seed, receiver_parameters=None, framing_parameters=None):
+    receiver_parameters = {**RECEIVER_DEFAULTS, **(receiver_parameters or {})}
+    framing_parameters = {**FRAMING_DEFAULTS, **(framing_parameters or {})}
+    for key in ("baud", "deviation", "node_count", "clock_node_count"):
+        receiver_parameters[key] = configuration[key]
+    start_cpu = time.process_time()
+
+    # Payloads come from RandomSymbolSource, seeded so every configuration sees the same bits
+    symbol_source = RandomSymbolSource(2, seed)
+    payload_input = NodeInput()
+    payload_input.assignProducer(symbol_source.outputs["symbols"])
+    payload_bits = framing_parameters["message_length"] * 8
+    payloads = (payload_input.read(frame_count * payload_bits) > 0).astype(int).reshape(frame_count, payload_bits)
+    chips = makeFrames(payloads, framing_parameters["sync"], framing_parameters["sync_length"], preamble_length, gap_length)
+
+    baud = configuration["baud"]
+    source = ArraySource(chips)
+    resampler = NearestNeighbourResampler(sample_rate / baud)
+    modulator = SineFrequencyModulator(receiver_parameters["center"], configuration["deviation"], sample_rate, True)
+    # The receiver expects real audio, a unit sine carries half the power of the complex oscillator
+    channel = AWGNChannel(configuration["snr"], signal_power=0.5, real=True, seed=seed)
+    resampler.inputs["original"].assignProducer(source.outputs["samples"])
+    modulator.inputs["baseband"].assignProducer(resampler.outputs["resampled"])
+    channel.inputs["original"].assignProducer(modulator.outputs["modulated"])
+    receiver = Receiver(channel.outputs["noisy"], sample_rate, **receiver_parameters)
+
+    sample_count = math.ceil(len(chips) * sample_rate / baud)
+    blocks = []
+    while channel.outputs["noisy"].position < sample_count + receiver.flush_count:
+        blocks.append(receiver.readSymbols())
+    frames = extractFrames(numpy.concatenate(blocks), **framing_parameters)
+    bit_errors = matchFrames(payloads, frames)
+    cpu_time = time.process_time() - start_cpu
+
+    detected = bit_errors >= 0
+    correct = int(numpy.sum(bit_errors == 0))
+    duration = sample_count / sample_rate
+    return {
+        **configuration,
+        # Energy per chip over the noise density, comparable across baud rates
+        "ecn0": configuration["snr"] + 10 * math.log10(sample_rate / baud),
+        "frames": frame_count,
+        "detected": int(numpy.sum(detected)),
+        "correct": correct,
+        "bit_errors": int(numpy.sum(bit_errors[detected])),
+        "ber": float(numpy.sum(bit_errors[detected]) / (numpy.sum(detected) * payload_bits)) if numpy.any(detected) else None,
+        "fer": 1 - correct / frame_count,
+        "goodput": correct * payload_bits / duration,
+        "duration": duration,
+        "cpu_time": cpu_time,
+        "cpu_load": cpu_time / duration,
+        }
+
+
+
+def makeGrid(snrs, bauds, deviations, node_counts, clock_node_counts):
+    keys = ("snr", "baud", "deviation", "node_count", "clock_node_count")
+    return [dict(zip(keys, values)) for values in itertools.product(snrs, bauds, deviations, node_counts, clock_node_counts)]
+
+
+
+def sweep(grid, output_directory, jobs=None, **options):
+    output_directory = pathlib.Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+    options = {**SWEEP_DEFAULTS, **options}
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(simulate, configuration, **options): configuration for configuration in grid}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = {**futures[future], "error": repr(error)}
+            results.append(result)
+            yield result
+
+    order = {tuple(configuration.values()): index for index, configuration in enumerate(grid)}
+    results.sort(key=lambda result: order[tuple(result[key] for key in grid[0])])
+    with open(output_directory / "results.json", "w") as results_file:
+        json.dump(results, results_file, indent=4)
+    with open(output_directory / "results.csv", "w", newline="") as results_file:
+        writer = csv.DictWriter(results_file, RESULT_FIELDS + ["error"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
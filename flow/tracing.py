@@ -0,0 +1,184 @@
+import collections
+import json
+import time
+
+
+
+def _ports(ports):
+    for key, port in ports.items():
+        if isinstance(port, list):
+            for index, member in enumerate(port):
+                yield f"{key}[{index}]", member
+        else:
+            yield key, port
+
+
+
+def _findEvent(events, position):
+    # Events are (time, start, end) in order, the first one covering the position is the one that moved it
+    for event_time, start, end in events:
+        if start <= position < end:
+            return event_time
+    return None
+
+
+
+class LatencyTracer:
+
+    def __init__(self, graph, history_size=4096, sample_rate=None, names=None):
+        self.graph = graph
+        self.history_size = history_size
+        self.sample_rate = sample_rate
+        self.markers = []
+        self.records = {}
+        self.names = self._nodeNames(names or {})
+
+    def _nodeNames(self, names):
+        counts = collections.Counter(type(node).__name__ for node in self.graph.nodes)
+        result = {}
+        for index, node in enumerate(self.graph.nodes):
+            name = type(node).__name__
+            result[node] = names.get(node, name if counts[name] == 1 else f"{name}[{index}]")
+        return result
+
+    def attach(self):
+        for node in self.graph.nodes:
+            for _, port in _ports(node.inputs):
+                port.trace = collections.deque(maxlen=self.history_size)
+            for _, port in _ports(node.outputs):
+                port.trace = collections.deque(maxlen=self.history_size)
+            if hasattr(node, "work"):
+                self.records[node] = collections.deque(maxlen=self.history_size)
+                node.work = self._wrapWork(node, node.work)
+
+    def detach(self):
+        for node in self.graph.nodes:
+            for _, port in _ports(node.inputs):
+                port.trace = None
+            for _, port in _ports(node.outputs):
+                port.trace = None
+            if node in self.records:
+                del node.work
+        self.records = {}
+
+    def _wrapWork(self, node, work):
+        records = self.records[node]
+
+        # Port positions around every call tie input positions to the output positions produced from them
+        def tracedWork(sample_count):
+            inputs = [port for _, port in _ports(node.inputs)]
+            outputs = [port for _, port in _ports(node.outputs)]
+            before = [port.position for port in inputs], [port.position for port in outputs]
+            work(sample_count)
+            after = [port.position for port in inputs], [port.position for port in outputs]
+            records.append((inputs, outputs, before, after))
+
+        return tracedWork
+
+    def mark(self, node_output):
+        # Call right before writing into a source, the marker follows the next sample written to node_output
+        marker = {"time": time.perf_counter(), "output": node_output, "position": node_output.position}
+        self.markers.append(marker)
+        return marker
+
+    def _owner(self, node_input):
+        for node in self.graph.nodes:
+            for key, port in _ports(node.inputs):
+                if port is node_input:
+                    return node, key
+        return None, None
+
+    def _mapThrough(self, node, node_input, node_output, position):
+        mapped = None
+        for inputs, outputs, before, after in self.records.get(node, ()):
+            if node_input not in inputs or node_output not in outputs:
+                continue
+            input_index = inputs.index(node_input)
+            output_index = outputs.index(node_output)
+            input_start, input_end = before[0][input_index], after[0][input_index]
+            if input_start <= position < input_end:
+                output_start, output_end = before[1][output_index], after[1][output_index]
+                ratio = (output_end - output_start) / (input_end - input_start)
+                mapped = output_start + (position - input_start) * ratio
+                break
+
+        if mapped == None:
+            # Nodes that move samples outside work(), like the AudioIO callback, are mapped by their overall rate
+            if node_input.position == 0:
+                return None
+            mapped = position * node_output.position / node_input.position
+
+        group_delay = node.getGroupDelay() if hasattr(node, "getGroupDelay") else 0
+        return mapped + group_delay, group_delay
+
+    def _follow(self, node_output, position, written_time, stages, paths):
+        followed = False
+        for consumer in node_output.buffers:
+            node, key = self._owner(consumer)
+            if node == None:
+                continue
+            followed = True
+            read_time = _findEvent(consumer.trace or (), position)
+            if read_time == None:
+                paths.append({"stages": stages, "complete": False})
+                continue
+
+            outputs = [(output_key, port) for output_key, port in _ports(node.outputs) if port.buffers]
+            if not outputs:
+                stage = {"stage": self.names[node], "input": key, "queue": read_time - written_time, "processing": 0.0, "group_delay": 0}
+                paths.append({"stages": stages + [stage], "complete": True})
+                continue
+
+            for output_key, port in outputs:
+                mapped = self._mapThrough(node, consumer, port, position)
+                output_time = None if mapped == None else _findEvent(port.trace or (), int(mapped[0]))
+                if output_time == None:
+                    paths.append({"stages": stages, "complete": False})
+                    continue
+                stage = {
+                    "stage": self.names[node],
+                    "input": key,
+                    "output": output_key,
+                    "queue": read_time - written_time,
+                    "processing": output_time - read_time,
+                    "group_delay": mapped[1],
+                    }
+                self._follow(port, int(mapped[0]), output_time, stages + [stage], paths)
+        if not followed:
+            paths.append({"stages": stages, "complete": True})
+
+    def trace(self, marker):
+        # Every path from the marked output to a sink, with the time each stage held on to the marked sample
+        paths = []
+        self._follow(marker["output"], marker["position"], marker["time"], [], paths)
+        for path in paths:
+            path["latency"] = sum(stage["queue"] + stage["processing"] for stage in path["stages"])
+        return paths
+
+    def getMetrics(self):
+        stages = collections.defaultdict(list)
+        group_delays = {}
+        end_to_end = []
+        for marker in self.markers:
+            for path in self.trace(marker):
+                if not path["complete"]:
+                    continue
+                end_to_end.append(path["latency"])
+                for stage in path["stages"]:
+                    stages[stage["stage"]].append(stage["queue"] + stage["processing"])
+                    group_delays[stage["stage"]] = stage["group_delay"]
+
+        def summary(values):
+            return {"count": len(values), "mean": sum(values) / len(values), "max": max(values)} if values else {"count": 0}
+
+        metrics = {"end_to_end": summary(end_to_end), "stages": {}}
+        for name, values in stages.items():
+            metrics["stages"][name] = summary(values)
+            metrics["stages"][name]["group_delay_samples"] = group_delays[name]
+            if self.sample_rate != None:
+                metrics["stages"][name]["group_delay"] = group_delays[name] / self.sample_rate
+        return metrics
+
+    def writeMetrics(self, path):
+        with open(path, "w") as metrics_file:
+            json.dump(self.getMetrics(), metrics_file, indent=4)
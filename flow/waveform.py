@@ -0,0 +1,137 @@
+from .nodes import BaseNode
+import collections
+import threading
+import hashlib
+import numpy
+
+
+
+class WaveformCache:
+
+    def __init__(self, memory_limit=2 ** 26):
+        self.memory_limit = memory_limit
+        self.entries = collections.OrderedDict()
+        self.byte_count = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, build):
+        # build returns the entry for a missing key, entries are (waveform, phase_advance)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.entries[key]
+            self.stats["misses"] += 1
+
+        entry = build()
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = entry
+                self.byte_count += entry[0].nbytes
+                # The newest entry is kept even if it doesn't fit on its own, it is about to be played
+                while self.byte_count > self.memory_limit and len(self.entries) > 1:
+                    _, (waveform, _) = self.entries.popitem(last=False)
+                    self.byte_count -= waveform.nbytes
+                    self.stats["evictions"] += 1
+        return entry
+
+    def getByteCount(self):
+        return self.byte_count
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.byte_count = 0
+
+
+
+def _toBits(segment):
+    if isinstance(segment, (bytes, bytearray)):
+        return numpy.unpackbits(numpy.frombuffer(bytes(segment), dtype=numpy.uint8))
+    return (numpy.asarray(segment) > 0).astype(numpy.uint8)
+
+
+
+class CachedFrameSource(BaseNode):
+
+    state_attributes = ("phase",)
+
+    def __init__(self, center_frequency, deviation, baud, sample_rate, manchester=True, idle_carrier=True, cache=None):
+        super().__init__()
+        self.defineOutput("modulated")
+
+        samples_per_symbol = sample_rate / baud
+        if abs(samples_per_symbol - round(samples_per_symbol)) > 1e-9:
+            raise ValueError("Cached segments only line up when the sample rate is a multiple of the baud rate")
+
+        self.center_frequency = center_frequency
+        self.deviation = deviation
+        self.sample_rate = sample_rate
+        self.samples_per_symbol = round(samples_per_symbol)
+        self.manchester = manchester
+        self.idle_carrier = idle_carrier
+        self.cache = cache if cache != None else WaveformCache()
+        self.parameters = (center_frequency, deviation, sample_rate, self.samples_per_symbol, manchester)
+
+        self.lock = threading.Lock()
+        self.queue = collections.deque()
+        self.queue_offset = 0
+        self.phase = 0.0
+        self.idle_tone = numpy.zeros(0, dtype=complex)
+
+    def _modulate(self, bits):
+        # The same waveform ManchesterCoder, a symbol-aligned resampler and SineFrequencyModulator produce, built once per segment
+        if self.manchester:
+            bits = numpy.stack([bits, 1 - bits], axis=1).ravel()
+        baseband = numpy.repeat(bits * 2.0 - 1, self.samples_per_symbol)
+        phase = numpy.cumsum(2 * numpy.pi * (baseband * self.deviation + self.center_frequency) / self.sample_rate)
+        return numpy.exp(1j * phase), float(phase[-1]) if len(phase) > 0 else 0.0
+
+    def getSegment(self, segment):
+        bits = _toBits(segment)
+        key = (self.parameters, hashlib.blake2b(numpy.packbits(bits).tobytes() + len(bits).to_bytes(8, "big")).digest())
+        return self.cache.get(key, lambda: self._modulate(bits))
+
+    def send(self, *segments):
+        # Segments are cached on their own, so a fixed preamble and sync prefix is shared by every frame
+        entries = [self.getSegment(segment) for segment in segments]
+        with self.lock:
+            for waveform, phase_advance in entries:
+                self.queue.append((waveform, phase_advance))
+
+    def getQueuedCount(self):
+        with self.lock:
+            return sum(len(waveform) for waveform, _ in self.queue) - self.queue_offset
+
+    def _idle(self, sample_count):
+        if not self.idle_carrier:
+            return numpy.zeros(sample_count, dtype=complex)
+        if len(self.idle_tone) < sample_count:
+            steps = numpy.arange(1, sample_count + 1) * (2 * numpy.pi * self.center_frequency / self.sample_rate)
+            self.idle_tone = numpy.exp(1j * steps)
+        idle = self.idle_tone[:sample_count] * numpy.exp(1j * self.phase)
+        self.phase = (self.phase + 2 * numpy.pi * self.center_frequency / self.sample_rate * sample_count) % (2 * numpy.pi)
+        return idle
+
+    def work(self, sample_count):
+        # Every cached segment starts at phase zero, rotating it by the running phase keeps the carrier continuous
+        chunks = []
+        remaining = sample_count
+        with self.lock:
+            while remaining > 0 and self.queue:
+                waveform, phase_advance = self.queue[0]
+                start = self.queue_offset
+                end = min(len(waveform), start + remaining)
+                rotation = numpy.exp(1j * self.phase)
+                chunks.append(waveform[start:end] * rotation)
+                remaining -= end - start
+                if end == len(waveform):
+                    self.queue.popleft()
+                    self.queue_offset = 0
+                    self.phase = (self.phase + phase_advance) % (2 * numpy.pi)
+                else:
+                    self.queue_offset = end
+            if remaining > 0:
+                chunks.append(self._idle(remaining))
+        self.outputs["modulated"].write(numpy.concatenate(chunks))